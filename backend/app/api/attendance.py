@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import date, datetime
-import base64
+import json
+import time
 
-from .. import models, schemas
-from ..database import get_db
-from ..dependencies import get_current_teacher, verify_class_ownership
-from ..face_recognition import FaceEncoder, FaceMatcher
+from .. import metrics, models, schemas
+from ..database import SessionLocal, get_async_db, get_db
+from ..dependencies import get_current_teacher, get_current_teacher_async, get_teacher_from_token, read_image_upload, verify_class_ownership
+from ..token_cache import TeacherPrincipal
+from ..embedding_cache import embedding_cache
+from ..security import student_photo_url
+from ..face_recognition import FaceDetector, LiveSession, RecognitionPoolBusy
+from ..face_recognition.frame_cache import recognize_frame
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
@@ -15,41 +25,79 @@ router = APIRouter(prefix="/attendance", tags=["attendance"])
 def mark_attendance(
     class_id: int,
     request: schemas.AttendanceMarkRequest,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Mark attendance using face recognition from webcam frame"""
+    try:
+        with metrics.STAGE_SECONDS.time(operation="mark", stage="b64_decode"):
+            frame = FaceDetector.base64_to_bytes(request.frame_base64)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to process frame: {str(e)}"
+        )
+    
+    return _mark_attendance(class_id, frame, current_teacher, db)
+
+@router.post("/class/{class_id}/mark/upload", response_model=schemas.AttendanceMarkResponse)
+def mark_attendance_upload(
+    class_id: int,
+    frame: bytes = Depends(read_image_upload),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Mark attendance from a raw JPEG/PNG frame (multipart or octet-stream body)"""
+    return _mark_attendance(class_id, frame, current_teacher, db)
+
+def _mark_attendance(class_id: int, frame: bytes, current_teacher: TeacherPrincipal, db: Session):
+    """Recognize the faces in a frame and write today's attendance"""
     verify_class_ownership(class_id, current_teacher, db)
     
-    # Get all students with face embeddings
-    students = db.query(models.Student).filter(
-        models.Student.class_id == class_id,
-        models.Student.face_embedding.isnot(None)
-    ).all()
+    # Get the class embedding matrix (cached across scans)
+    with metrics.STAGE_SECONDS.time(operation="mark", stage="db_read"):
+        index = embedding_cache.get(class_id, db)
     
-    if not students:
+    if len(index) == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No students with registered faces in this class"
         )
     
-    # Detect faces in the frame
+    # Detect faces in the frame on the recognition pool, unless it was just seen
+    # Only an undecodable frame is the client's fault; pool failures stay 5xx
     try:
-        detected_encodings = FaceEncoder.generate_encodings_from_frame(request.frame_base64)
-    except Exception as e:
+        _, detected_encodings, timings = recognize_frame(frame)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to process frame: {str(e)}"
         )
     
-    # Prepare known embeddings
-    known_embeddings = []
-    for student in students:
-        embedding = FaceEncoder.bytes_to_encoding(student.face_embedding)
-        known_embeddings.append((student.id, embedding))
-    
     # Match faces
-    present_student_ids = FaceMatcher.match_faces(detected_encodings, known_embeddings)
+    match_started = time.perf_counter()
+    matches = index.match(detected_encodings)
+    present_student_ids = {student_id for _, student_id, _ in matches}
+    timings["match_ms"] = (time.perf_counter() - match_started) * 1000
+    metrics.observe_timings("mark", timings)
+    metrics.observe_frame("mark", len(detected_encodings), len(matches))
+    
+    return _save_attendance(db, class_id, present_student_ids, timings)
+
+def _save_attendance(
+    db: Session,
+    class_id: int,
+    present_student_ids,
+    timings: Optional[dict] = None,
+    operation: str = "mark"
+) -> schemas.AttendanceMarkResponse:
+    """Write today's attendance for every enrolled student and build the response"""
+    # Load student details (binary columns are deferred)
+    with metrics.STAGE_SECONDS.time(operation=operation, stage="db_read"):
+        students = db.query(models.Student).filter(
+            models.Student.class_id == class_id,
+            models.Student.face_embedding.isnot(None)
+        ).order_by(models.Student.id).all()
     
     # Get today's date
     today = date.today()
@@ -61,35 +109,13 @@ def mark_attendance(
     for student in students:
         is_present = student.id in present_student_ids
         
-        # Check existing attendance
-        existing_attendance = db.query(models.Attendance).filter(
-            models.Attendance.student_id == student.id,
-            models.Attendance.date == today
-        ).first()
-        
-        if existing_attendance:
-            existing_attendance.is_present = is_present
-            existing_attendance.marked_at = datetime.utcnow()
-        else:
-            attendance = models.Attendance(
-                student_id=student.id,
-                class_id=class_id,
-                date=today,
-                is_present=is_present
-            )
-            db.add(attendance)
-        
         # Prepare response
-        photo_base64 = None
-        if student.photo:
-            photo_base64 = base64.b64encode(student.photo).decode()
-        
         student_response = schemas.StudentResponse(
             id=student.id,
             name=student.name,
             roll_number=student.roll_number,
             class_id=student.class_id,
-            photo=photo_base64,
+            photo_url=student_photo_url(student),
             has_face_data=True,
             created_at=student.created_at
         )
@@ -99,7 +125,20 @@ def mark_attendance(
         else:
             absent_students.append(student_response)
     
+    # Write the whole class in one statement
+    write_started = time.perf_counter()
+    _upsert_attendance(db, [
+        {
+            "student_id": student.id,
+            "class_id": class_id,
+            "date": today,
+            "is_present": student.id in present_student_ids
+        }
+        for student in students
+    ])
     db.commit()
+    write_ms = (time.perf_counter() - write_started) * 1000
+    metrics.STAGE_SECONDS.observe(write_ms / 1000, operation=operation, stage="db_write")
     
     return schemas.AttendanceMarkResponse(
         date=today,
@@ -107,65 +146,298 @@ def mark_attendance(
         present_count=len(present_students),
         absent_count=len(absent_students),
         present_students=present_students,
-        absent_students=absent_students
+        absent_students=absent_students,
+        write_ms=round(write_ms, 2),
+        timings={stage: round(ms, 2) for stage, ms in timings.items()} if timings else None
     )
 
+def _upsert_attendance(db: Session, rows: List[dict]):
+    """
+    Insert or update attendance rows keyed on unique_attendance_per_day
+    
+    Uses INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite so the
+    whole batch is one round-trip; other dialects fall back to row-by-row.
+    """
+    if not rows:
+        return
+    
+    dialect = db.get_bind().dialect.name
+    
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            stmt = postgresql_insert(models.Attendance).values(rows)
+            conflict_target = {"constraint": "unique_attendance_per_day"}
+        else:
+            stmt = sqlite_insert(models.Attendance).values(rows)
+            conflict_target = {"index_elements": ["student_id", "date"]}
+        
+        stmt = stmt.on_conflict_do_update(
+            **conflict_target,
+            set_={
+                "is_present": stmt.excluded.is_present,
+                "marked_at": func.now()
+            }
+        )
+        db.execute(stmt)
+        return
+    
+    for row in rows:
+        existing_attendance = db.query(models.Attendance).filter(
+            models.Attendance.student_id == row["student_id"],
+            models.Attendance.date == row["date"]
+        ).first()
+        
+        if existing_attendance:
+            existing_attendance.is_present = row["is_present"]
+            existing_attendance.marked_at = datetime.utcnow()
+        else:
+            db.add(models.Attendance(**row))
+
+@router.websocket("/class/{class_id}/live")
+async def live_attendance(websocket: WebSocket, class_id: int, token: str = ""):
+    """
+    Stream webcam frames for a scanning session over a WebSocket
+    
+    The token is passed as a query parameter since browsers cannot set
+    headers on WebSocket requests. Each frame is either a binary message
+    holding the raw JPEG/PNG bytes or a JSON text message with a
+    frame_base64 field; the server answers with the students seen for the
+    first time in the session, and "mode" says whether the frame was
+    skipped as static, searched only where it changed, or searched whole.
+    Sending {"type": "finish"} (or disconnecting after at least one frame)
+    writes the accumulated attendance once.
+    """
+    setup = await run_in_threadpool(_load_live_class, class_id, token)
+    if setup is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    index, students = setup
+    
+    await websocket.accept()
+    
+    if len(index) == 0:
+        await websocket.send_json({
+            "type": "error",
+            "detail": "No students with registered faces in this class"
+        })
+        await websocket.close()
+        return
+    
+    session = LiveSession(index)
+    await websocket.send_json({"type": "ready", "total_students": len(index)})
+    
+    finished = False
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            try:
+                if message.get("bytes") is not None:
+                    frame = message["bytes"]
+                else:
+                    payload = json.loads(message.get("text") or "{}")
+                    if payload.get("type") == "finish":
+                        finished = True
+                        break
+                    with metrics.STAGE_SECONDS.time(operation="live", stage="b64_decode"):
+                        frame = FaceDetector.base64_to_bytes(payload.get("frame_base64", ""))
+                
+                newly_present = await run_in_threadpool(session.process_frame, frame)
+            except RecognitionPoolBusy:
+                await websocket.send_json({
+                    "type": "busy",
+                    "detail": "Recognition workers are busy, frame dropped"
+                })
+                continue
+            except Exception as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"Failed to process frame: {str(e)}"
+                })
+                continue
+            
+            await websocket.send_json({
+                "type": "frame",
+                "faces_detected": session.last_faces_detected,
+                "faces_tracked": session.last_faces_tracked,
+                "mode": session.last_mode,
+                "present_count": len(session.present_ids),
+                "timings": {stage: round(ms, 2) for stage, ms in session.last_timings.items()},
+                "newly_present": [
+                    students.get(student_id, {"id": student_id, "name": "Unknown", "roll_number": None})
+                    for student_id in newly_present
+                ]
+            })
+    except WebSocketDisconnect:
+        pass
+    
+    if not finished and session.frames_processed == 0:
+        return
+    
+    db = SessionLocal()
+    try:
+        result = await run_in_threadpool(_save_attendance, db, class_id, session.present_ids, None, "live")
+    finally:
+        db.close()
+    
+    if finished:
+        await websocket.send_json({"type": "complete", "result": jsonable_encoder(result)})
+        await websocket.close()
+
+def _load_live_class(class_id: int, token: str):
+    """
+    Authenticate a live session and load its class, on a threadpool thread
+    
+    Returns:
+        Tuple of (embedding index, students by id), or None if the token is
+        invalid or the teacher does not own the class
+    """
+    db = SessionLocal()
+    try:
+        teacher = get_teacher_from_token(token, db)
+        if teacher is None:
+            return None
+        try:
+            verify_class_ownership(class_id, teacher, db)
+        except HTTPException:
+            return None
+        
+        index = embedding_cache.get(class_id, db)
+        students = {
+            student_id: {"id": student_id, "name": name, "roll_number": roll_number}
+            for student_id, name, roll_number in db.query(
+                models.Student.id, models.Student.name, models.Student.roll_number
+            ).filter(models.Student.class_id == class_id).all()
+        }
+        return index, students
+    finally:
+        db.close()
+
 @router.get("/class/{class_id}/history", response_model=List[schemas.AttendanceDateResponse])
-def get_attendance_history(
+async def get_attendance_history(
     class_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    response: Response,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    before: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=366),
+    summary: bool = False,
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
-    """Get attendance history for a class"""
+    """
+    Get attendance history for a class, newest date first
+    
+    date_from/date_to bound the range (inclusive). For keyset pagination
+    pass limit, then the X-Next-Before response header as before= to get
+    the next page. summary=true returns per-date counts without the
+    per-student rows.
+    """
+    history = await db.run_sync(
+        _attendance_history, class_id, current_teacher, date_from, date_to, before, limit, summary
+    )
+    
+    if limit is not None and len(history) == limit:
+        response.headers["X-Next-Before"] = history[-1].date.isoformat()
+    
+    return history
+
+def _attendance_history(
+    db: Session,
+    class_id: int,
+    current_teacher: TeacherPrincipal,
+    date_from: Optional[date],
+    date_to: Optional[date],
+    before: Optional[date],
+    limit: Optional[int],
+    summary: bool
+) -> List[schemas.AttendanceDateResponse]:
+    """Rows of the history endpoint, run on either the sync or the async engine"""
     verify_class_ownership(class_id, current_teacher, db)
     
-    attendance_dates = db.query(models.Attendance.date).filter(
-        models.Attendance.class_id == class_id
-    ).distinct().order_by(models.Attendance.date.desc()).all()
+    date_filters = [models.Attendance.class_id == class_id]
+    if date_from is not None:
+        date_filters.append(models.Attendance.date >= date_from)
+    if date_to is not None:
+        date_filters.append(models.Attendance.date <= date_to)
+    if before is not None:
+        date_filters.append(models.Attendance.date < before)
     
-    response = []
-    for (attendance_date,) in attendance_dates:
-        attendances = db.query(models.Attendance).filter(
-            models.Attendance.class_id == class_id,
-            models.Attendance.date == attendance_date
-        ).all()
+    present_total = func.sum(case((models.Attendance.is_present, 1), else_=0))
+    
+    if summary:
+        query = db.query(
+            models.Attendance.date,
+            func.count(models.Attendance.id),
+            present_total
+        ).filter(*date_filters).group_by(
+            models.Attendance.date
+        ).order_by(models.Attendance.date.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        
+        history = [
+            schemas.AttendanceDateResponse(
+                date=attendance_date,
+                total_students=total,
+                present_count=present_count or 0,
+                absent_count=total - (present_count or 0),
+                attendances=[]
+            )
+            for attendance_date, total, present_count in query.all()
+        ]
+    else:
+        # Page of dates as a subquery so rows and names come back in one query
+        page_dates = db.query(models.Attendance.date).filter(
+            *date_filters
+        ).distinct().order_by(models.Attendance.date.desc())
+        if limit is not None:
+            page_dates = page_dates.limit(limit)
         
-        attendance_records = []
-        present_count = 0
+        rows = db.query(models.Attendance, models.Student.name).outerjoin(
+            models.Student, models.Student.id == models.Attendance.student_id
+        ).filter(
+            models.Attendance.class_id == class_id,
+            models.Attendance.date.in_(page_dates.subquery().select())
+        ).order_by(models.Attendance.date.desc(), models.Attendance.id).all()
         
-        for attendance in attendances:
-            student = db.query(models.Student).filter(
-                models.Student.id == attendance.student_id
-            ).first()
+        history = []
+        for attendance, student_name in rows:
+            if not history or history[-1].date != attendance.date:
+                history.append(schemas.AttendanceDateResponse(
+                    date=attendance.date,
+                    total_students=0,
+                    present_count=0,
+                    absent_count=0,
+                    attendances=[]
+                ))
+            day = history[-1]
             
+            day.total_students += 1
             if attendance.is_present:
-                present_count += 1
+                day.present_count += 1
+            else:
+                day.absent_count += 1
             
-            attendance_records.append(schemas.AttendanceResponse(
+            day.attendances.append(schemas.AttendanceResponse(
                 id=attendance.id,
                 student_id=attendance.student_id,
-                student_name=student.name if student else "Unknown",
+                student_name=student_name or "Unknown",
                 class_id=attendance.class_id,
                 date=attendance.date,
                 is_present=attendance.is_present,
                 marked_at=attendance.marked_at
             ))
-        
-        response.append(schemas.AttendanceDateResponse(
-            date=attendance_date,
-            total_students=len(attendances),
-            present_count=present_count,
-            absent_count=len(attendances) - present_count,
-            attendances=attendance_records
-        ))
-    
-    return response
+    
+    return history
 
 @router.put("/{attendance_id}", response_model=schemas.AttendanceResponse)
 def update_attendance(
     attendance_id: int,
     update_data: schemas.AttendanceUpdate,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Update an attendance record"""
@@ -201,7 +473,7 @@ def update_attendance(
 @router.delete("/{attendance_id}")
 def delete_attendance(
     attendance_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Delete an attendance record"""
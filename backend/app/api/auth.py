@@ -1,30 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import base64
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
 from ..security import get_password_hash, verify_password, create_access_token
-from ..dependencies import get_current_teacher
+from ..dependencies import get_current_teacher_async
+from ..token_cache import TeacherPrincipal
+from ..loaders import load_teacher_photo
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# The handlers are async and reach the database through run_sync(); password
+# hashing is CPU-bound and goes to the threadpool so it never blocks the loop.
 
-@router.post("/register", response_model=schemas.Token)
-def register_teacher(teacher: schemas.TeacherCreate, db: Session = Depends(get_db)):
-    """Register a new teacher"""
-    existing_teacher = db.query(models.Teacher).filter(
-        models.Teacher.email == teacher.email
-    ).first()
-
-    if existing_teacher:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-
-    hashed_password = get_password_hash(teacher.password)
+def _find_teacher(db: Session, email: str):
+    return db.query(
+        models.Teacher.id,
+        models.Teacher.email,
+        models.Teacher.name,
+        models.Teacher.hashed_password
+    ).filter(models.Teacher.email == email).first()
 
+def _insert_teacher(db: Session, teacher: schemas.TeacherCreate, hashed_password: str) -> int:
     db_teacher = models.Teacher(
         email=teacher.email,
         name=teacher.name,
@@ -33,15 +32,30 @@ def register_teacher(teacher: schemas.TeacherCreate, db: Session = Depends(get_d
 
     db.add(db_teacher)
     db.commit()
-    db.refresh(db_teacher)
+    return db_teacher.id
+
+
+@router.post("/register", response_model=schemas.Token)
+async def register_teacher(teacher: schemas.TeacherCreate, db=Depends(get_async_db)):
+    """Register a new teacher"""
+    existing_teacher = await db.run_sync(_find_teacher, teacher.email)
+
+    if existing_teacher:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+
+    hashed_password = await run_in_threadpool(get_password_hash, teacher.password)
+    teacher_id = await db.run_sync(_insert_teacher, teacher, hashed_password)
 
     # FIX: store sub as string
-    access_token = create_access_token(data={"sub": str(db_teacher.id)})
+    access_token = create_access_token(data={"sub": str(teacher_id)})
 
     teacher_response = schemas.TeacherResponse(
-        id=db_teacher.id,
-        email=db_teacher.email,
-        name=db_teacher.name,
+        id=teacher_id,
+        email=teacher.email,
+        name=teacher.name,
         photo=None
     )
 
@@ -53,13 +67,13 @@ def register_teacher(teacher: schemas.TeacherCreate, db: Session = Depends(get_d
 
 
 @router.post("/login", response_model=schemas.Token)
-def login_teacher(credentials: schemas.TeacherLogin, db: Session = Depends(get_db)):
+async def login_teacher(credentials: schemas.TeacherLogin, db=Depends(get_async_db)):
     """Login teacher"""
-    teacher = db.query(models.Teacher).filter(
-        models.Teacher.email == credentials.email
-    ).first()
+    teacher = await db.run_sync(_find_teacher, credentials.email)
 
-    if not teacher or not verify_password(credentials.password, teacher.hashed_password):
+    if not teacher or not await run_in_threadpool(
+        verify_password, credentials.password, teacher.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -68,9 +82,10 @@ def login_teacher(credentials: schemas.TeacherLogin, db: Session = Depends(get_d
     # FIX: store sub as string
     access_token = create_access_token(data={"sub": str(teacher.id)})
 
+    photo = await db.run_sync(load_teacher_photo, teacher.id)
     photo_base64 = None
-    if teacher.photo:
-        photo_base64 = base64.b64encode(teacher.photo).decode()
+    if photo:
+        photo_base64 = base64.b64encode(photo).decode()
 
     teacher_response = schemas.TeacherResponse(
         id=teacher.id,
@@ -87,13 +102,15 @@ def login_teacher(credentials: schemas.TeacherLogin, db: Session = Depends(get_d
 
 
 @router.get("/me", response_model=schemas.TeacherResponse)
-def get_current_teacher_info(
-    current_teacher: models.Teacher = Depends(get_current_teacher)
+async def get_current_teacher_info(
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Get current teacher information"""
+    photo = await db.run_sync(load_teacher_photo, current_teacher.id)
     photo_base64 = None
-    if current_teacher.photo:
-        photo_base64 = base64.b64encode(current_teacher.photo).decode()
+    if photo:
+        photo_base64 = base64.b64encode(photo).decode()
 
     return schemas.TeacherResponse(
         id=current_teacher.id,
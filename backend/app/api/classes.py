@@ -1,20 +1,66 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
 
 from .. import models, schemas
-from ..database import get_db
-from ..dependencies import get_current_teacher
+from ..database import get_async_db
+from ..dependencies import get_current_teacher_async
+from ..token_cache import TeacherPrincipal
+from ..embedding_cache import embedding_cache
+from ..identification import identification_index
 
 router = APIRouter(prefix="/classes", tags=["classes"])
 
+# Handlers are async; each runs its queries as one run_sync() call
+
+def _class_listing_query(db: Session, teacher_id: int):
+    """
+    Classes of a teacher with their aggregates, in one statement
+    
+    Rows are (Class, student_count, face_enrolled_count, last_attendance_date):
+    students are counted through a LEFT JOIN ... GROUP BY and the last
+    attendance date comes from a correlated MAX on the (class_id, date) index.
+    """
+    last_attendance_date = db.query(func.max(models.Attendance.date)).filter(
+        models.Attendance.class_id == models.Class.id
+    ).correlate(models.Class).scalar_subquery()
+    
+    return db.query(
+        models.Class,
+        func.count(models.Student.id),
+        func.count(models.Student.face_embedding),
+        last_attendance_date
+    ).outerjoin(
+        models.Student, models.Student.class_id == models.Class.id
+    ).filter(
+        models.Class.teacher_id == teacher_id
+    ).group_by(models.Class.id)
+
+def _class_response(row) -> schemas.ClassResponse:
+    class_obj, student_count, face_enrolled_count, last_attendance_date = row
+    return schemas.ClassResponse(
+        id=class_obj.id,
+        name=class_obj.name,
+        subject=class_obj.subject,
+        teacher_id=class_obj.teacher_id,
+        created_at=class_obj.created_at,
+        student_count=student_count,
+        face_enrolled_count=face_enrolled_count,
+        last_attendance_date=last_attendance_date
+    )
+
 @router.post("", response_model=schemas.ClassResponse)
-def create_class(
+async def create_class(
     class_data: schemas.ClassCreate,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Create a new class"""
+    return await db.run_sync(_create_class, class_data, current_teacher)
+
+def _create_class(db: Session, class_data: schemas.ClassCreate, current_teacher: TeacherPrincipal):
     db_class = models.Class(
         name=class_data.name,
         subject=class_data.subject,
@@ -35,15 +81,16 @@ def create_class(
     )
 
 @router.get("", response_model=List[schemas.ClassResponse])
-def get_classes(
+async def get_classes(
     search: str = "",
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Get all classes for current teacher"""
-    query = db.query(models.Class).filter(
-        models.Class.teacher_id == current_teacher.id
-    )
+    return await db.run_sync(_get_classes, search, current_teacher)
+
+def _get_classes(db: Session, search: str, current_teacher: TeacherPrincipal):
+    query = _class_listing_query(db, current_teacher.id)
     
     if search:
         query = query.filter(
@@ -51,61 +98,43 @@ def get_classes(
             models.Class.subject.ilike(f"%{search}%")
         )
     
-    classes = query.all()
-    
-    response = []
-    for class_obj in classes:
-        student_count = db.query(models.Student).filter(
-            models.Student.class_id == class_obj.id
-        ).count()
-        
-        response.append(schemas.ClassResponse(
-            id=class_obj.id,
-            name=class_obj.name,
-            subject=class_obj.subject,
-            teacher_id=class_obj.teacher_id,
-            created_at=class_obj.created_at,
-            student_count=student_count
-        ))
-    
-    return response
+    return [_class_response(row) for row in query.all()]
 
 @router.get("/{class_id}", response_model=schemas.ClassResponse)
-def get_class(
+async def get_class(
     class_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Get a specific class"""
-    class_obj = db.query(models.Class).filter(
-        models.Class.id == class_id,
-        models.Class.teacher_id == current_teacher.id
+    return await db.run_sync(_get_class, class_id, current_teacher)
+
+def _get_class(db: Session, class_id: int, current_teacher: TeacherPrincipal):
+    row = _class_listing_query(db, current_teacher.id).filter(
+        models.Class.id == class_id
     ).first()
     
-    if not class_obj:
+    if not row:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    student_count = db.query(models.Student).filter(
-        models.Student.class_id == class_obj.id
-    ).count()
-    
-    return schemas.ClassResponse(
-        id=class_obj.id,
-        name=class_obj.name,
-        subject=class_obj.subject,
-        teacher_id=class_obj.teacher_id,
-        created_at=class_obj.created_at,
-        student_count=student_count
-    )
+    return _class_response(row)
 
 @router.put("/{class_id}", response_model=schemas.ClassResponse)
-def update_class(
+async def update_class(
     class_id: int,
     class_data: schemas.ClassUpdate,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Update a class"""
+    return await db.run_sync(_update_class, class_id, class_data, current_teacher)
+
+def _update_class(
+    db: Session,
+    class_id: int,
+    class_data: schemas.ClassUpdate,
+    current_teacher: TeacherPrincipal
+):
     class_obj = db.query(models.Class).filter(
         models.Class.id == class_id,
         models.Class.teacher_id == current_teacher.id
@@ -120,28 +149,27 @@ def update_class(
         class_obj.subject = class_data.subject
     
     db.commit()
-    db.refresh(class_obj)
     
-    student_count = db.query(models.Student).filter(
-        models.Student.class_id == class_obj.id
-    ).count()
+    row = _class_listing_query(db, current_teacher.id).filter(
+        models.Class.id == class_id
+    ).first()
     
-    return schemas.ClassResponse(
-        id=class_obj.id,
-        name=class_obj.name,
-        subject=class_obj.subject,
-        teacher_id=class_obj.teacher_id,
-        created_at=class_obj.created_at,
-        student_count=student_count
-    )
+    return _class_response(row)
 
 @router.delete("/{class_id}")
-def delete_class(
+async def delete_class(
     class_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher_async),
+    db=Depends(get_async_db)
 ):
     """Delete a class"""
+    student_ids = await db.run_sync(_delete_class, class_id, current_teacher)
+    # File locks and index saves stay off the event loop (run_sync runs on it with DB_ASYNC)
+    await run_in_threadpool(_forget_class, class_id, student_ids)
+    return {"message": "Class deleted successfully"}
+
+def _delete_class(db: Session, class_id: int, current_teacher: TeacherPrincipal) -> List[int]:
+    """Delete the class and its students; returns the deleted student IDs"""
     class_obj = db.query(models.Class).filter(
         models.Class.id == class_id,
         models.Class.teacher_id == current_teacher.id
@@ -150,7 +178,17 @@ def delete_class(
     if not class_obj:
         raise HTTPException(status_code=404, detail="Class not found")
     
+    student_ids = [
+        student_id for (student_id,) in db.query(models.Student.id).filter(
+            models.Student.class_id == class_id
+        )
+    ]
+    
     db.delete(class_obj)
     db.commit()
     
-    return {"message": "Class deleted successfully"}
+    return student_ids
+
+def _forget_class(class_id: int, student_ids: List[int]):
+    embedding_cache.invalidate(class_id)
+    identification_index.remove_students(student_ids)
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile, status
 from sqlalchemy.orm import Session
-from typing import List
-import base64
+from typing import List, Optional
+import csv
+import io
+import logging
+import zipfile
 
-from .. import models, schemas
+import numpy as np
+
+from .. import metrics, models, schemas
+from ..config import settings
 from ..database import get_db
-from ..dependencies import get_current_teacher, verify_class_ownership
-from ..face_recognition import FaceDetector, FaceEncoder
+from ..dependencies import get_current_teacher, read_image_upload, verify_class_ownership
+from ..token_cache import TeacherPrincipal
+from ..embedding_cache import embedding_cache
+from ..identification import identification_index
+from ..loaders import load_student_photo, load_student_samples
+from ..security import photo_etag, student_photo_url, verify_photo_signature
+from ..face_recognition import FaceDetector, FaceEncoder, recognition_pool
+from ..face_recognition.frame_cache import recognize_frame
+from ..face_recognition.tasks import enroll_face
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/students", tags=["students"])
 
@@ -14,44 +29,92 @@ router = APIRouter(prefix="/students", tags=["students"])
 def create_student(
     class_id: int,
     student_data: schemas.StudentCreate,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Enroll a new student with face recognition"""
-    verify_class_ownership(class_id, current_teacher, db)
-    
-    # Verify face quality
-    quality_check = FaceDetector.verify_face_quality(student_data.photo_base64)
-    if not quality_check["valid"]:
+    try:
+        with metrics.STAGE_SECONDS.time(operation="enroll", stage="b64_decode"):
+            photo = FaceDetector.base64_to_bytes(student_data.photo_base64)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=quality_check["message"]
+            detail=str(e)
         )
     
-    # Generate face embedding
+    return _create_student(
+        class_id,
+        student_data.name,
+        student_data.roll_number,
+        photo,
+        current_teacher,
+        db
+    )
+
+@router.post("/class/{class_id}/upload", response_model=schemas.StudentResponse)
+def create_student_upload(
+    class_id: int,
+    name: str = Form(...),
+    roll_number: Optional[str] = Form(None),
+    photo: UploadFile = File(...),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Enroll a new student from a multipart form with a raw photo file"""
+    return _create_student(
+        class_id,
+        name,
+        roll_number,
+        photo.file.read(),
+        current_teacher,
+        db
+    )
+
+def _create_student(
+    class_id: int,
+    name: str,
+    roll_number: Optional[str],
+    photo: bytes,
+    current_teacher: TeacherPrincipal,
+    db: Session
+) -> schemas.StudentResponse:
+    """Verify, encode and store a new student's face"""
+    verify_class_ownership(class_id, current_teacher, db)
+    
+    # Verify face quality and generate face embedding on the recognition pool
     try:
-        embedding, face_image = FaceEncoder.generate_encoding(student_data.photo_base64)
-        embedding_bytes = FaceEncoder.encoding_to_bytes(embedding)
-        face_image_bytes = face_image.tobytes()
+        enrollment, thumbnail = recognition_pool.run(enroll_face, photo)
+        metrics.observe_timings("enroll", enrollment.timings)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
     
+    if not enrollment.valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=enrollment.message
+        )
+    
+    thumbnail_bytes, thumbnail_width, thumbnail_height = thumbnail
+    
     # Create student
     db_student = models.Student(
-        name=student_data.name,
-        roll_number=student_data.roll_number,
+        name=name,
+        roll_number=roll_number,
         class_id=class_id,
-        face_embedding=embedding_bytes,
-        photo=face_image_bytes
+        **_single_sample_columns(class_id, enrollment.encoding),
+        photo=thumbnail_bytes,
+        photo_width=thumbnail_width,
+        photo_height=thumbnail_height,
+        photo_etag=photo_etag(thumbnail_bytes)
     )
     
     try:
-        db.add(db_student)
-        db.commit()
-        db.refresh(db_student)
+        with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_write"):
+            db.add(db_student)
+            db.commit()
     except Exception as e:
         db.rollback()
         if "unique_roll_per_class" in str(e):
@@ -63,25 +126,327 @@ def create_student(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create student"
         )
-    
-    photo_base64 = None
-    if db_student.photo:
-        photo_base64 = FaceDetector.image_to_base64(face_image)
+    db.refresh(db_student)
+    _refresh_class_caches(db, class_id, [db_student.id])
     
     return schemas.StudentResponse(
         id=db_student.id,
         name=db_student.name,
         roll_number=db_student.roll_number,
         class_id=db_student.class_id,
-        photo=photo_base64,
-        has_face_data=db_student.face_embedding is not None,
+        photo_url=student_photo_url(db_student),
+        has_face_data=db_student.has_face_data,
         created_at=db_student.created_at
     )
 
+@router.post("/class/{class_id}/bulk", response_model=schemas.BulkEnrollmentResponse)
+def create_students_bulk(
+    class_id: int,
+    names: List[str] = Form(...),
+    roll_numbers: Optional[List[str]] = Form(None),
+    photos: List[UploadFile] = File(...),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Enroll many students from one multipart form
+    
+    `names`, `roll_numbers` and `photos` are repeated fields matched by
+    position; an empty roll number means none.
+    """
+    if len(photos) != len(names) or (roll_numbers is not None and len(roll_numbers) != len(names)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="names, roll_numbers and photos must have the same number of entries"
+        )
+    
+    entries = [
+        {
+            "name": name,
+            "roll_number": (roll_numbers[i] or None) if roll_numbers else None,
+            "photo": photo.file.read(settings.BULK_ENROLL_MAX_PHOTO_BYTES + 1),
+            "error": None
+        }
+        for i, (name, photo) in enumerate(zip(names, photos))
+    ]
+    return _create_students_bulk(class_id, entries, current_teacher, db)
+
+@router.post("/class/{class_id}/bulk/zip", response_model=schemas.BulkEnrollmentResponse)
+def create_students_bulk_zip(
+    class_id: int,
+    archive: UploadFile = File(...),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Enroll many students from a ZIP archive
+    
+    The archive must contain a manifest.csv with the columns name,
+    roll_number and photo, where photo is the path of the image inside
+    the archive.
+    """
+    try:
+        entries = _read_enrollment_archive(archive.file)
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid enrollment archive: {str(e)}"
+        )
+    
+    return _create_students_bulk(class_id, entries, current_teacher, db)
+
+def _read_enrollment_archive(fileobj) -> List[dict]:
+    """
+    Read the manifest and photos of a bulk enrollment ZIP
+
+    Declared sizes are checked before anything is inflated (reads stop at
+    the declared size), so a small archive of highly compressible entries
+    cannot expand past BULK_ENROLL_MAX_TOTAL_BYTES in memory.
+    """
+    with zipfile.ZipFile(fileobj) as archive:
+        manifest_info = archive.getinfo("manifest.csv")
+        total_bytes = manifest_info.file_size
+        if total_bytes > settings.BULK_ENROLL_MAX_TOTAL_BYTES:
+            raise ValueError("manifest is too large")
+        manifest = io.TextIOWrapper(archive.open(manifest_info), encoding="utf-8-sig")
+        rows = list(csv.DictReader(manifest))
+        
+        if len(rows) > settings.BULK_ENROLL_MAX_ITEMS:
+            raise ValueError(f"at most {settings.BULK_ENROLL_MAX_ITEMS} students per batch")
+        
+        entries = []
+        infos = []
+        for row in rows:
+            entry = {
+                "name": (row.get("name") or "").strip(),
+                "roll_number": (row.get("roll_number") or "").strip() or None,
+                "photo": None,
+                "error": None
+            }
+            path = (row.get("photo") or "").strip()
+            info = None
+            try:
+                info = archive.getinfo(path)
+            except KeyError:
+                entry["error"] = f"Photo '{path}' not found in archive"
+            else:
+                if info.file_size > settings.BULK_ENROLL_MAX_PHOTO_BYTES:
+                    entry["error"] = "Photo is too large"
+                    info = None
+                else:
+                    total_bytes += info.file_size
+            entries.append(entry)
+            infos.append(info)
+        
+        if total_bytes > settings.BULK_ENROLL_MAX_TOTAL_BYTES:
+            raise ValueError(
+                f"photos expand to more than {settings.BULK_ENROLL_MAX_TOTAL_BYTES // (1024 * 1024)} MB"
+            )
+        for entry, info in zip(entries, infos):
+            if info is not None:
+                entry["photo"] = archive.read(info)
+    
+    return entries
+
+def _create_students_bulk(
+    class_id: int,
+    entries: List[dict],
+    current_teacher: TeacherPrincipal,
+    db: Session
+) -> schemas.BulkEnrollmentResponse:
+    """
+    Validate and encode every entry on the recognition pool, then insert all
+    enrollable students in one transaction
+    
+    Each entry is a dict with name, roll_number, photo and error keys;
+    entries that already carry an error are reported without encoding.
+    """
+    verify_class_ownership(class_id, current_teacher, db)
+    
+    if len(entries) > settings.BULK_ENROLL_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_ENROLL_MAX_ITEMS} students per batch"
+        )
+    
+    # Reject duplicate roll numbers before spending time on encoding
+    with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_read"):
+        taken = {
+            roll_number for (roll_number,) in db.query(models.Student.roll_number).filter(
+                models.Student.class_id == class_id,
+                models.Student.roll_number.isnot(None)
+            )
+        }
+    for entry in entries:
+        if entry["error"]:
+            continue
+        if not entry["name"]:
+            entry["error"] = "Name is required"
+        elif not entry["photo"]:
+            entry["error"] = "Photo is required"
+        elif len(entry["photo"]) > settings.BULK_ENROLL_MAX_PHOTO_BYTES:
+            entry["error"] = "Photo is too large"
+        elif entry["roll_number"] is not None:
+            if entry["roll_number"] in taken:
+                entry["error"] = "Roll number already exists in this class"
+            else:
+                taken.add(entry["roll_number"])
+    
+    pending = [entry for entry in entries if not entry["error"]]
+    outcomes = recognition_pool.map(enroll_face, [entry["photo"] for entry in pending])
+    
+    students = []
+    for entry, (outcome, error) in zip(pending, outcomes):
+        if error is not None:
+            entry["error"] = str(error) if isinstance(error, ValueError) else "Failed to process photo"
+            continue
+        enrollment, thumbnail = outcome
+        metrics.observe_timings("enroll", enrollment.timings)
+        if not enrollment.valid:
+            entry["error"] = enrollment.message
+            continue
+        
+        thumbnail_bytes, thumbnail_width, thumbnail_height = thumbnail
+        entry["student"] = models.Student(
+            name=entry["name"],
+            roll_number=entry["roll_number"],
+            class_id=class_id,
+            **_single_sample_columns(class_id, enrollment.encoding),
+            photo=thumbnail_bytes,
+            photo_width=thumbnail_width,
+            photo_height=thumbnail_height,
+            photo_etag=photo_etag(thumbnail_bytes)
+        )
+        students.append(entry["student"])
+    
+    created = {}
+    if students:
+        try:
+            with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_write"):
+                db.add_all(students)
+                db.flush()
+                student_ids = [student.id for student in students]
+                db.commit()
+        except Exception:
+            db.rollback()
+            for entry in entries:
+                if entry.get("student") is not None:
+                    entry["error"] = "Failed to create student"
+        else:
+            _refresh_class_caches(db, class_id, student_ids)
+            created = {
+                student.id: student for student in db.query(models.Student).filter(
+                    models.Student.id.in_(student_ids)
+                )
+            }
+            for entry, student_id in zip(
+                (entry for entry in entries if entry.get("student") is not None), student_ids
+            ):
+                entry["student_id"] = student_id
+    
+    items = []
+    for index, entry in enumerate(entries):
+        student = created.get(entry.get("student_id"))
+        items.append(schemas.BulkEnrollmentItem(
+            index=index,
+            name=entry["name"],
+            roll_number=entry["roll_number"],
+            success=student is not None,
+            student=schemas.StudentResponse(
+                id=student.id,
+                name=student.name,
+                roll_number=student.roll_number,
+                class_id=student.class_id,
+                photo_url=student_photo_url(student),
+                has_face_data=True,
+                created_at=student.created_at
+            ) if student is not None else None,
+            error=entry["error"]
+        ))
+    
+    return schemas.BulkEnrollmentResponse(
+        created_count=len(created),
+        failed_count=len(entries) - len(created),
+        items=items
+    )
+
+@router.post("/identify", response_model=schemas.IdentifyResponse)
+def identify_faces(
+    request: schemas.IdentifyRequest,
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Find the closest enrolled students, across every class, for each face in a frame"""
+    try:
+        frame = FaceDetector.base64_to_bytes(request.frame_base64)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return _identify_faces(frame, db)
+
+@router.post("/identify/upload", response_model=schemas.IdentifyResponse)
+def identify_faces_upload(
+    frame: bytes = Depends(read_image_upload),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Identify faces from a raw image upload"""
+    return _identify_faces(frame, db)
+
+def _identify_faces(frame: bytes, db: Session) -> schemas.IdentifyResponse:
+    """Encode a frame and look every face up in the institution-wide index"""
+    # Only an undecodable frame is the client's fault; pool failures stay 5xx
+    try:
+        _, detected_encodings, _ = recognize_frame(frame)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to process frame: {str(e)}"
+        )
+    
+    identification_index.ensure_loaded(db)
+    results = identification_index.search(detected_encodings)
+    
+    # Student and class details for every candidate in one query
+    candidate_ids = {student_id for candidates in results for student_id, _ in candidates}
+    details = {}
+    if candidate_ids:
+        details = {
+            row.id: row for row in db.query(
+                models.Student.id,
+                models.Student.name,
+                models.Student.roll_number,
+                models.Student.class_id,
+                models.Class.name.label("class_name")
+            ).join(models.Class).filter(models.Student.id.in_(candidate_ids))
+        }
+    
+    faces = []
+    for face_index, candidates in enumerate(results):
+        faces.append(schemas.IdentifiedFace(
+            face_index=face_index,
+            candidates=[
+                schemas.IdentifyCandidate(
+                    student_id=student_id,
+                    name=details[student_id].name,
+                    roll_number=details[student_id].roll_number,
+                    class_id=details[student_id].class_id,
+                    class_name=details[student_id].class_name,
+                    distance=round(distance, 4)
+                )
+                for student_id, distance in candidates if student_id in details
+            ]
+        ))
+    
+    return schemas.IdentifyResponse(faces_detected=len(detected_encodings), faces=faces)
+
 @router.get("/class/{class_id}", response_model=List[schemas.StudentResponse])
 def get_students(
     class_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Get all students in a class"""
@@ -93,33 +458,102 @@ def get_students(
     
     response = []
     for student in students:
-        photo_base64 = None
-        if student.photo:
-            try:
-                photo_base64 = base64.b64encode(student.photo).decode()
-            except:
-                pass
-        
         response.append(schemas.StudentResponse(
             id=student.id,
             name=student.name,
             roll_number=student.roll_number,
             class_id=student.class_id,
-            photo=photo_base64,
-            has_face_data=student.face_embedding is not None,
+            photo_url=student_photo_url(student),
+            has_face_data=student.has_face_data,
             created_at=student.created_at
         ))
     
     return response
 
+@router.get("/{student_id}/photo")
+def get_student_photo(
+    student_id: int,
+    v: str,
+    sig: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Serve a student's thumbnail
+    
+    Authorized by the signature in the URL handed out as photo_url, so it
+    works from <img> tags. The URL is versioned by content hash, so the
+    response can be cached indefinitely.
+    """
+    if not verify_photo_signature(student_id, v, sig):
+        raise HTTPException(status_code=403, detail="Invalid photo signature")
+    
+    etag = f'"{v}"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    photo, current_etag = load_student_photo(db, student_id)
+    
+    if photo is None or current_etag != v:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    media_type = "image/webp" if photo[8:12] == b"WEBP" else "image/jpeg"
+    return Response(content=photo, media_type=media_type, headers=cache_headers)
+
 @router.put("/{student_id}", response_model=schemas.StudentResponse)
 def update_student(
     student_id: int,
     student_data: schemas.StudentUpdate,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Update a student"""
+    photo = None
+    if student_data.photo_base64:
+        try:
+            with metrics.STAGE_SECONDS.time(operation="enroll", stage="b64_decode"):
+                photo = FaceDetector.base64_to_bytes(student_data.photo_base64)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    return _update_student(
+        student_id,
+        student_data.name,
+        student_data.roll_number,
+        photo,
+        current_teacher,
+        db
+    )
+
+@router.put("/{student_id}/upload", response_model=schemas.StudentResponse)
+def update_student_upload(
+    student_id: int,
+    name: Optional[str] = Form(None),
+    roll_number: Optional[str] = Form(None),
+    photo: Optional[UploadFile] = File(None),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Update a student from a multipart form with an optional raw photo file"""
+    photo_bytes = photo.file.read() if photo is not None else None
+    return _update_student(student_id, name, roll_number, photo_bytes, current_teacher, db)
+
+def _update_student(
+    student_id: int,
+    name: Optional[str],
+    roll_number: Optional[str],
+    photo: Optional[bytes],
+    current_teacher: TeacherPrincipal,
+    db: Session
+) -> schemas.StudentResponse:
+    """Apply name, roll number and optional new photo to a student"""
     student = db.query(models.Student).filter(
         models.Student.id == student_id
     ).first()
@@ -129,50 +563,179 @@ def update_student(
     
     verify_class_ownership(student.class_id, current_teacher, db)
     
-    if student_data.name is not None:
-        student.name = student_data.name
-    if student_data.roll_number is not None:
-        student.roll_number = student_data.roll_number
+    if name is not None:
+        student.name = name
+    if roll_number is not None:
+        student.roll_number = roll_number
     
-    if student_data.photo_base64:
-        quality_check = FaceDetector.verify_face_quality(student_data.photo_base64)
-        if not quality_check["valid"]:
+    if photo is not None:
+        try:
+            enrollment, thumbnail = recognition_pool.run(enroll_face, photo)
+            metrics.observe_timings("enroll", enrollment.timings)
+        except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=quality_check["message"]
+                detail=str(e)
             )
         
-        try:
-            embedding, face_image = FaceEncoder.generate_encoding(student_data.photo_base64)
-            student.face_embedding = FaceEncoder.encoding_to_bytes(embedding)
-            student.photo = face_image.tobytes()
-        except ValueError as e:
+        if not enrollment.valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=str(e)
+                detail=enrollment.message
             )
+        
+        # A new photo re-enrolls the student: drop every earlier sample
+        db.query(models.FaceEmbedding).filter(
+            models.FaceEmbedding.student_id == student.id
+        ).delete(synchronize_session=False)
+        embedding = FaceEncoder.encoding_to_bytes(enrollment.encoding)
+        db.add(models.FaceEmbedding(
+            student_id=student.id,
+            class_id=student.class_id,
+            embedding=embedding
+        ))
+        student.face_embedding = embedding
+        student.face_samples = embedding
+        
+        thumbnail_bytes, thumbnail_width, thumbnail_height = thumbnail
+        student.photo = thumbnail_bytes
+        student.photo_width = thumbnail_width
+        student.photo_height = thumbnail_height
+        student.photo_etag = photo_etag(thumbnail_bytes)
     
-    db.commit()
+    with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_write"):
+        db.commit()
     db.refresh(student)
-    
-    photo_base64 = None
-    if student.photo:
-        photo_base64 = base64.b64encode(student.photo).decode()
+    _refresh_class_caches(db, student.class_id, [student.id] if photo is not None else [])
     
     return schemas.StudentResponse(
         id=student.id,
         name=student.name,
         roll_number=student.roll_number,
         class_id=student.class_id,
-        photo=photo_base64,
-        has_face_data=student.face_embedding is not None,
+        photo_url=student_photo_url(student),
+        has_face_data=student.has_face_data,
         created_at=student.created_at
     )
 
+@router.post("/{student_id}/embeddings", response_model=schemas.FaceSamplesResponse)
+def add_face_sample(
+    student_id: int,
+    sample_data: schemas.FaceSampleCreate,
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Add another face sample to a student without replacing the others"""
+    try:
+        with metrics.STAGE_SECONDS.time(operation="enroll", stage="b64_decode"):
+            photo = FaceDetector.base64_to_bytes(sample_data.photo_base64)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return _add_face_sample(student_id, photo, current_teacher, db)
+
+@router.post("/{student_id}/embeddings/upload", response_model=schemas.FaceSamplesResponse)
+def add_face_sample_upload(
+    student_id: int,
+    photo: UploadFile = File(...),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Add another face sample to a student from a raw photo file"""
+    return _add_face_sample(student_id, photo.file.read(), current_teacher, db)
+
+def _add_face_sample(
+    student_id: int,
+    photo: bytes,
+    current_teacher: TeacherPrincipal,
+    db: Session
+) -> schemas.FaceSamplesResponse:
+    """Encode a photo, append it to the student's samples and repack them"""
+    student = db.query(models.Student).filter(
+        models.Student.id == student_id
+    ).first()
+    
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    
+    verify_class_ownership(student.class_id, current_teacher, db)
+    
+    try:
+        enrollment, _ = recognition_pool.run(enroll_face, photo)
+        metrics.observe_timings("enroll", enrollment.timings)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if not enrollment.valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=enrollment.message
+        )
+    
+    db.add(models.FaceEmbedding(
+        student_id=student.id,
+        class_id=student.class_id,
+        embedding=FaceEncoder.encoding_to_bytes(enrollment.encoding)
+    ))
+    db.flush()
+    
+    # Keep the newest samples only, so the set follows the student over the term
+    stale_ids = [
+        embedding_id for (embedding_id,) in db.query(models.FaceEmbedding.id).filter(
+            models.FaceEmbedding.student_id == student.id
+        ).order_by(models.FaceEmbedding.id.desc()).offset(settings.FACE_SAMPLES_PER_STUDENT)
+    ]
+    if stale_ids:
+        db.query(models.FaceEmbedding).filter(
+            models.FaceEmbedding.id.in_(stale_ids)
+        ).delete(synchronize_session=False)
+    
+    with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_read"):
+        stored_samples = load_student_samples(db, student.id)
+    samples = np.vstack([FaceEncoder.bytes_to_encodings(sample) for sample in stored_samples])
+    student.face_samples = FaceEncoder.encodings_to_bytes(samples)
+    student.face_embedding = FaceEncoder.encoding_to_bytes(samples.mean(axis=0))
+    
+    class_id = student.class_id
+    with metrics.STAGE_SECONDS.time(operation="enroll", stage="db_write"):
+        db.commit()
+    _refresh_class_caches(db, class_id, [student_id])
+    
+    return schemas.FaceSamplesResponse(student_id=student_id, sample_count=len(samples))
+
+def _refresh_class_caches(db: Session, class_id: int, student_ids: List[int]):
+    """
+    Drop the class's cached embeddings and re-sync students in the identification index
+
+    Runs after the commit, so a failure here is logged rather than failing the
+    request: the cache entry expires and the index is re-synced on its next refresh.
+    """
+    try:
+        embedding_cache.invalidate(class_id)
+        if student_ids:
+            identification_index.sync_students(db, student_ids)
+    except Exception:
+        logger.warning("Refreshing caches for class %s failed", class_id, exc_info=True)
+
+def _single_sample_columns(class_id: int, encoding) -> dict:
+    """Student column values for a face enrolled from one sample"""
+    embedding = FaceEncoder.encoding_to_bytes(encoding)
+    return {
+        "face_embedding": embedding,
+        "face_samples": embedding,
+        "embeddings": [models.FaceEmbedding(class_id=class_id, embedding=embedding)]
+    }
+
 @router.delete("/{student_id}")
 def delete_student(
     student_id: int,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Delete a student"""
@@ -185,7 +748,9 @@ def delete_student(
     
     verify_class_ownership(student.class_id, current_teacher, db)
     
+    class_id = student.class_id
     db.delete(student)
     db.commit()
+    _refresh_class_caches(db, class_id, [student_id])
     
     return {"message": "Student deleted successfully"}
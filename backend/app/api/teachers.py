@@ -5,13 +5,14 @@ import base64
 from .. import models
 from ..database import get_db
 from ..dependencies import get_current_teacher
+from ..token_cache import TeacherPrincipal, token_cache
 
 router = APIRouter(prefix="/teachers", tags=["teachers"])
 
 @router.put("/photo")
 def update_teacher_photo(
     photo_base64: str,
-    current_teacher: models.Teacher = Depends(get_current_teacher),
+    current_teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Update teacher photo"""
@@ -20,8 +21,11 @@ def update_teacher_photo(
             photo_base64 = photo_base64.split(",")[1]
         
         photo_bytes = base64.b64decode(photo_base64)
-        current_teacher.photo = photo_bytes
+        db.query(models.Teacher).filter(
+            models.Teacher.id == current_teacher.id
+        ).update({"photo": photo_bytes})
         db.commit()
+        token_cache.invalidate_teacher(current_teacher.id)
         
         return {"message": "Photo updated successfully"}
     except Exception as e:
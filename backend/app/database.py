@@ -1,20 +1,122 @@
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
+from .metrics import DB_POOL_CHECKOUT_SECONDS
 
-engine = create_engine(settings.DATABASE_URL)
+def _pool_options(url: str) -> dict:
+    """Engine pool arguments from settings; SQLite keeps its default pool"""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE
+    }
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT
+        )
+    return options
+
+def async_database_url() -> str:
+    """ASYNC_DATABASE_URL, or DATABASE_URL switched to its asyncio driver"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, rest = settings.DATABASE_URL.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    driver = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}.get(backend)
+    if driver is None:
+        raise ValueError(f"No asyncio driver known for {backend}; set ASYNC_DATABASE_URL")
+    return f"{backend}+{driver}://{rest}"
+
+engine = create_engine(settings.DATABASE_URL, **_pool_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Optional asyncio engine for the routers that do no recognition work
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(async_database_url(), **_pool_options(async_database_url()))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+def _checkout(db: Session):
+    # Check the connection out up front so pool waits are measured on their own
+    with DB_POOL_CHECKOUT_SECONDS.time():
+        db.connection()
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
     try:
+        _checkout(db)
         yield db
     finally:
         db.close()
 
+class ThreadedSession:
+    """
+    A sync Session behind the run_sync() method of AsyncSession
+
+    Used by get_async_db() when DB_ASYNC is off, so async handlers work on
+    either engine; each call then occupies a threadpool slot only while it
+    runs. The connection is checked out on the first call, so a request
+    that never queries (a token cache hit on a handler with no database
+    work) never waits on the pool.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._checked_out = False
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(self._call, fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        if not self._checked_out:
+            _checkout(self.session)
+            self._checked_out = True
+        return fn(self.session, *args, **kwargs)
+
+class LazyAsyncSession:
+    """An AsyncSession that checks out its connection on the first run_sync()"""
+
+    def __init__(self, session):
+        self.session = session
+        self._checked_out = False
+
+    async def run_sync(self, fn, *args, **kwargs):
+        if not self._checked_out:
+            with DB_POOL_CHECKOUT_SECONDS.time():
+                await self.session.connection()
+            self._checked_out = True
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+async def get_async_db():
+    """
+    Dependency for async handlers: a LazyAsyncSession when DB_ASYNC is on,
+    otherwise a ThreadedSession
+
+    Handlers should only use run_sync(fn, *args), which calls fn(session,
+    *args) with a regular Session on both paths.
+    """
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield ThreadedSession(db)
+        finally:
+            await run_in_threadpool(db.close)
+        return
+
+    async with AsyncSessionLocal() as db:
+        yield LazyAsyncSession(db)
+
 def init_db():
     """Initialize database tables"""
+    from .migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
@@ -1,16 +1,45 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from typing import Optional
 from . import models
-from .database import get_db
+from .database import get_async_db, get_db
 from .security import decode_access_token
+from .token_cache import TeacherPrincipal, token_cache
 
 security = HTTPBearer()
 
+def get_teacher_from_token(token: str, db: Session) -> Optional[TeacherPrincipal]:
+    """Resolve a bearer token to a teacher principal, or None if it is invalid"""
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+    return load_teacher_from_token(token, db)
+
+def load_teacher_from_token(token: str, db: Session) -> Optional[TeacherPrincipal]:
+    """Verify a token and load its teacher into the token cache, skipping the cache lookup"""
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    
+    teacher_id: int = payload.get("sub")
+    if teacher_id is None:
+        return None
+    
+    row = db.query(models.Teacher.id, models.Teacher.email, models.Teacher.name).filter(
+        models.Teacher.id == teacher_id
+    ).first()
+    if row is None:
+        return None
+    
+    principal = TeacherPrincipal(id=row.id, email=row.email, name=row.name)
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
+
 def get_current_teacher(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> models.Teacher:
+) -> TeacherPrincipal:
     """Get the current authenticated teacher"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -18,23 +47,31 @@ def get_current_teacher(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token = credentials.credentials
-    payload = decode_access_token(token)
-    
-    if payload is None:
-        raise credentials_exception
-    
-    teacher_id: int = payload.get("sub")
-    if teacher_id is None:
+    teacher = get_teacher_from_token(credentials.credentials, db)
+    if teacher is None:
         raise credentials_exception
     
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
+    return teacher
+
+async def get_current_teacher_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db=Depends(get_async_db)
+) -> TeacherPrincipal:
+    """get_current_teacher for async handlers; a token cache hit never touches the database"""
+    token = credentials.credentials
+    teacher = token_cache.get(token)
     if teacher is None:
-        raise credentials_exception
+        teacher = await db.run_sync(lambda session: load_teacher_from_token(token, session))
+    if teacher is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
     return teacher
 
-def verify_class_ownership(class_id: int, teacher: models.Teacher, db: Session):
+def verify_class_ownership(class_id: int, teacher: TeacherPrincipal, db: Session):
     """Verify that the teacher owns the class"""
     class_obj = db.query(models.Class).filter(models.Class.id == class_id).first()
     if not class_obj:
@@ -42,3 +79,24 @@ def verify_class_ownership(class_id: int, teacher: models.Teacher, db: Session):
     if class_obj.teacher_id != teacher.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this class")
     return class_obj
+
+async def read_image_upload(request: Request) -> bytes:
+    """
+    Read raw image bytes from a multipart upload or an
+    application/octet-stream (or image/*) request body
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = next((value for value in form.values() if hasattr(value, "read")), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="No image file in upload")
+        image_data = await upload.read()
+    else:
+        image_data = await request.body()
+    
+    if not image_data:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+    
+    return image_data
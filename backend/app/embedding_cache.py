@@ -0,0 +1,235 @@
+"""Process-level cache of per-class face embedding matrices"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .embedding_store import embedding_store
+from .face_recognition import FaceEncoder, FaceMatcher
+from .loaders import load_class_embeddings
+
+logger = logging.getLogger(__name__)
+
+class ClassEmbeddingIndex:
+    """
+    Contiguous centroid and sample matrices with the aligned student IDs of
+    one class
+
+    Row j of matrix is the centroid of student_ids[j], whose samples are
+    samples[sample_offsets[j]:sample_offsets[j + 1]].
+    """
+
+    def __init__(
+        self,
+        class_id: int,
+        student_ids: np.ndarray,
+        matrix: np.ndarray,
+        samples: Optional[np.ndarray] = None,
+        sample_offsets: Optional[np.ndarray] = None
+    ):
+        self.class_id = class_id
+        self.student_ids = student_ids
+        self.matrix = matrix
+        if samples is None:
+            samples = matrix
+            sample_offsets = np.arange(len(student_ids) + 1, dtype=np.int64)
+        self.samples = samples
+        self.sample_offsets = sample_offsets
+        self.radii = self._radii()
+        self.loaded_at = time.monotonic()
+        # Embedding store version of the class when loaded; None if read around the store
+        self.store_version = None
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = self.matrix.nbytes + self.student_ids.nbytes + self.sample_offsets.nbytes + self.radii.nbytes
+        if self.samples is not self.matrix:
+            nbytes += self.samples.nbytes
+        return nbytes
+
+    def match(self, detected_encodings, tolerance: float = None):
+        """Match detected faces against every sample of every student"""
+        return FaceMatcher.match_faces_samples(
+            detected_encodings, self.matrix, self.samples, self.sample_offsets,
+            self.radii, self.student_ids, tolerance
+        )
+
+    def _radii(self) -> np.ndarray:
+        """Largest distance from each centroid to one of its samples"""
+        if len(self.student_ids) == 0:
+            return np.empty(0, dtype=self.matrix.dtype)
+        counts = np.diff(self.sample_offsets)
+        spread = np.linalg.norm(self.samples - np.repeat(self.matrix, counts, axis=0), axis=1)
+        return np.maximum.reduceat(spread, self.sample_offsets[:-1])
+
+    @classmethod
+    def load(cls, db: Session, class_id: int, use_store: bool = True) -> "ClassEmbeddingIndex":
+        """
+        Map the index from the shared embedding store, filling the store
+        from the database on a miss
+
+        The store is only an accelerator: if it cannot be read or written
+        the index is built from the database.
+        """
+        if not embedding_store.enabled or not use_store:
+            return cls.load_from_db(db, class_id)
+
+        index = None
+        try:
+            # Read before the data, so a change in between only makes the index look stale
+            version = embedding_store.class_version(class_id)
+            stored = embedding_store.get_class(class_id)
+            if stored is None:
+                index = cls.load_from_db(db, class_id)
+                index.store_version = version
+                if not embedding_store.put_class(
+                    class_id, version, index.student_ids, index.matrix, index.samples, index.sample_offsets
+                ):
+                    return index
+                stored = embedding_store.get_class(class_id)
+                if stored is None:
+                    return index
+        except OSError as e:
+            logger.warning(f"Embedding store unavailable for class {class_id}, using the database: {str(e)}")
+            return index if index is not None else cls.load_from_db(db, class_id)
+
+        student_ids, centroids, samples, sample_offsets = stored
+        index = cls(class_id, student_ids, centroids, samples, sample_offsets)
+        index.store_version = version
+        return index
+
+    @classmethod
+    def load_from_db(cls, db: Session, class_id: int) -> "ClassEmbeddingIndex":
+        """Build the index from the database, reading only ids and embeddings"""
+        rows = load_class_embeddings(db, class_id)
+
+        student_ids = np.array([student_id for student_id, _, _ in rows], dtype=np.int64)
+        if not rows:
+            return cls(class_id, student_ids, np.empty((0, 128), dtype=np.float32))
+
+        # Matching runs in float32 whatever format each row was stored in
+        matrix = np.ascontiguousarray(np.vstack([
+            FaceEncoder.bytes_to_encoding(embedding) for _, embedding, _ in rows
+        ]), dtype=np.float32)
+        # Students enrolled before samples were kept have their centroid only
+        sample_sets = [
+            FaceEncoder.bytes_to_encodings(samples) if samples else matrix[j:j + 1]
+            for j, (_, _, samples) in enumerate(rows)
+        ]
+        samples = np.ascontiguousarray(np.vstack(sample_sets), dtype=np.float32)
+        sample_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(sample_set) for sample_set in sample_sets], out=sample_offsets[1:])
+
+        return cls(class_id, student_ids, matrix, samples, sample_offsets)
+
+
+class EmbeddingCache:
+    """
+    LRU cache mapping class_id to a ClassEmbeddingIndex
+
+    Entries are loaded lazily and evicted when either the number of classes
+    or the total matrix size exceeds its limit. Student writes must call
+    invalidate() so the next scan reloads the class. Each hit is checked
+    against the class version in the embedding store manifest, so an
+    invalidate() in another worker is seen on the next scan; the TTL only
+    bounds staleness when the store cannot be read.
+    """
+
+    def __init__(
+        self,
+        max_classes: int = None,
+        max_bytes: int = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.max_classes = max_classes or settings.EMBEDDING_CACHE_MAX_CLASSES
+        self.max_bytes = max_bytes or settings.EMBEDDING_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.EMBEDDING_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[int, ClassEmbeddingIndex]" = OrderedDict()
+        self._versions = {}
+        self._unstored = set()  # classes whose stored copy could not be dropped
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, class_id: int, db: Session) -> ClassEmbeddingIndex:
+        """Return the cached index for a class, loading it on a miss"""
+        with self._lock:
+            index = self._entries.get(class_id)
+            if index is not None and not self._expired(index):
+                self._entries.move_to_end(class_id)
+            else:
+                index = None
+            version = self._versions.get(class_id, 0)
+            use_store = class_id not in self._unstored
+
+        if index is not None and not self._changed_in_store(index):
+            return index
+
+        index = ClassEmbeddingIndex.load(db, class_id, use_store)
+
+        with self._lock:
+            # Drop the result if the class was invalidated while loading
+            if self._versions.get(class_id, 0) == version:
+                self._discard(class_id)
+                self._entries[class_id] = index
+                self._bytes += index.nbytes
+                self._evict()
+        return index
+
+    def invalidate(self, class_id: int):
+        """Forget the cached and stored index for a class"""
+        with self._lock:
+            self._versions[class_id] = self._versions.get(class_id, 0) + 1
+            self._discard(class_id)
+        try:
+            embedding_store.drop_class(class_id)
+        except OSError as e:
+            # The stored copy may now be stale; stop reading it in this process
+            logger.warning(f"Could not drop class {class_id} from the embedding store: {str(e)}")
+            with self._lock:
+                self._unstored.add(class_id)
+
+    def clear(self):
+        """Forget every cached index"""
+        with self._lock:
+            for class_id in list(self._entries):
+                self._versions[class_id] = self._versions.get(class_id, 0) + 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _expired(self, index: ClassEmbeddingIndex) -> bool:
+        if not self.ttl_seconds:
+            return False
+        return time.monotonic() - index.loaded_at > self.ttl_seconds
+
+    def _changed_in_store(self, index: ClassEmbeddingIndex) -> bool:
+        """Whether another process invalidated the class since it was loaded"""
+        if index.store_version is None:
+            return False
+        try:
+            return embedding_store.class_version(index.class_id) != index.store_version
+        except OSError as e:
+            logger.warning(f"Could not check class {index.class_id} in the embedding store: {str(e)}")
+            return False
+
+    def _discard(self, class_id: int):
+        index = self._entries.pop(class_id, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_classes or self._bytes > self.max_bytes
+        ):
+            _, index = self._entries.popitem(last=False)
+            self._bytes -= index.nbytes
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,325 @@
+"""
+On-disk, memory-mapped store of per-class embedding matrices
+
+All classes share one float32 row file and one int64 id file. A JSON
+manifest holds the per-class offset table. Each class segment is its
+centroid rows (one per student, by student id) followed by its sample rows
+(grouped in the same student order). The id file holds the owning student
+of every row.
+
+The row files are append-only: a changed class is written as a new segment
+at the end and the manifest is swapped atomically. The previous segment
+becomes garbage, and once garbage dominates the store is compacted into a
+new generation of files. Readers map only the rows the manifest covers, so
+every worker process shares the same pages through the page cache and
+opening the store costs a stat, a small JSON read and an mmap.
+
+Run `python -m app.embedding_store` to regenerate the store from the
+database.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+MAP_ATTEMPTS = 3  # manifest reads before giving up on files it names
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped class embedding store shared by all worker processes
+
+    Writers take an exclusive file lock. Every class has a version that
+    drop_class() bumps; put_class() only writes if the version it read
+    before loading from the database is still current, so a load that races
+    with a student write can never persist stale rows.
+    """
+
+    def __init__(self, directory: str = None, dim: int = 128, compact_ratio: float = None):
+        self.directory = settings.EMBEDDING_STORE_DIR if directory is None else directory
+        self.dim = dim
+        self.compact_ratio = compact_ratio or settings.EMBEDDING_STORE_COMPACT_RATIO
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+        self._rows = None
+        self._ids = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def get_class(self, class_id: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Zero-copy views of one class, or None if it is not stored
+
+        Returns:
+            Tuple of (student_ids, centroids, samples, sample_offsets)
+        """
+        with self._lock:
+            manifest = self._current()
+            entry = manifest["classes"].get(str(class_id))
+            if entry is None:
+                return None
+            rows, ids = self._rows, self._ids
+
+        start, n_students, n_samples = entry
+        middle, stop = start + n_students, start + n_students + n_samples
+        if stop == start:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty((0, self.dim), dtype=np.float32),
+                np.empty((0, self.dim), dtype=np.float32),
+                np.zeros(1, dtype=np.int64)
+            )
+
+        student_ids = ids[start:middle]
+        sample_offsets = np.empty(n_students + 1, dtype=np.int64)
+        sample_offsets[:-1] = np.searchsorted(ids[middle:stop], student_ids)
+        sample_offsets[-1] = n_samples
+        return student_ids, rows[start:middle], rows[middle:stop], sample_offsets
+
+    def class_version(self, class_id: int) -> int:
+        """Version to pass to put_class() for data loaded after this call"""
+        with self._lock:
+            return self._current()["versions"].get(str(class_id), 0)
+
+    def put_class(
+        self,
+        class_id: int,
+        version: int,
+        student_ids: np.ndarray,
+        centroids: np.ndarray,
+        samples: np.ndarray,
+        sample_offsets: np.ndarray
+    ) -> bool:
+        """
+        Append a class segment; returns False if the class changed since
+        `version` was read
+        """
+        owners = np.repeat(np.asarray(student_ids, dtype=np.int64), np.diff(sample_offsets))
+        segment_rows = np.vstack([
+            np.asarray(centroids, dtype=np.float32).reshape(-1, self.dim),
+            np.asarray(samples, dtype=np.float32).reshape(-1, self.dim)
+        ])
+        segment_ids = np.concatenate([np.asarray(student_ids, dtype=np.int64), owners])
+
+        with self._write_lock():
+            manifest = self._read_manifest()
+            if manifest["versions"].get(str(class_id), 0) != version:
+                return False
+
+            start = manifest["rows"]
+            self._append(manifest, segment_rows, segment_ids)
+            manifest["classes"][str(class_id)] = [start, len(student_ids), len(owners)]
+            manifest["rows"] = start + len(segment_ids)
+
+            if manifest["rows"] > self.compact_ratio * self._live_rows(manifest) + 1024:
+                manifest = self._compact(manifest)
+            self._write_manifest(manifest)
+        return True
+
+    def drop_class(self, class_id: int):
+        """Forget a class after its students changed"""
+        if not self.enabled:
+            return
+        with self._write_lock():
+            manifest = self._read_manifest()
+            manifest["classes"].pop(str(class_id), None)
+            manifest["versions"][str(class_id)] = manifest["versions"].get(str(class_id), 0) + 1
+            self._write_manifest(manifest)
+
+    def rebuild(self, db: Session) -> int:
+        """Regenerate the whole store from the database; returns classes written"""
+        from .embedding_cache import ClassEmbeddingIndex
+
+        class_ids = [class_id for (class_id,) in db.query(models.Class.id).order_by(models.Class.id)]
+        with self._write_lock():
+            manifest = self._read_manifest()
+            old_files = (manifest["row_file"], manifest["id_file"])
+            manifest = self._start_generation(manifest)
+            manifest["classes"] = {}
+
+            for class_id in class_ids:
+                index = ClassEmbeddingIndex.load_from_db(db, class_id)
+                owners = np.repeat(index.student_ids, np.diff(index.sample_offsets))
+                start = manifest["rows"]
+                self._append(
+                    manifest,
+                    np.vstack([index.matrix, index.samples]).astype(np.float32),
+                    np.concatenate([index.student_ids, owners])
+                )
+                manifest["classes"][str(class_id)] = [start, len(index), len(owners)]
+                manifest["rows"] = start + len(index) + len(owners)
+
+            self._write_manifest(manifest)
+            self._remove_files(old_files)
+        logger.info(f"Rebuilt embedding store with {len(class_ids)} classes")
+        return len(class_ids)
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            try:
+                manifest = self._current()
+            except OSError as e:
+                return {"enabled": True, "error": str(e)}
+            return {
+                "enabled": True,
+                "generation": manifest["generation"],
+                "classes": len(manifest["classes"]),
+                "rows": manifest["rows"],
+                "live_rows": self._live_rows(manifest)
+            }
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _current(self) -> dict:
+        """The manifest as of the last change on disk, with rows mapped to match"""
+        for _ in range(MAP_ATTEMPTS):
+            # The manifest is replaced, never rewritten, so a new inode means a change
+            try:
+                stat = os.stat(self._path(MANIFEST))
+                mtime = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                mtime = None
+            if self._manifest is not None and mtime == self._manifest_mtime:
+                return self._manifest
+
+            manifest = self._read_manifest()
+            rows = manifest["rows"]
+            if rows:
+                try:
+                    row_map = np.memmap(self._path(manifest["row_file"]), dtype=np.float32, mode="r", shape=(rows, self.dim))
+                    id_map = np.memmap(self._path(manifest["id_file"]), dtype=np.int64, mode="r", shape=(rows,))
+                except FileNotFoundError:
+                    # Compacted away between reading the manifest and mapping; retry
+                    continue
+            else:
+                row_map = np.empty((0, self.dim), dtype=np.float32)
+                id_map = np.empty(0, dtype=np.int64)
+            self._rows, self._ids = row_map, id_map
+            self._manifest = manifest
+            self._manifest_mtime = mtime
+            return manifest
+
+        raise FileNotFoundError(f"Embedding store files named in {self._path(MANIFEST)} are missing")
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                "generation": 0,
+                "dim": self.dim,
+                "row_file": "rows-0.f32",
+                "id_file": "ids-0.i64",
+                "rows": 0,
+                "classes": {},
+                "versions": {}
+            }
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = self._path(f"{MANIFEST}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path(MANIFEST))
+
+    def _append(self, manifest: dict, rows: np.ndarray, ids: np.ndarray):
+        """Append after the last committed row, dropping any torn tail first"""
+        for name, data, itemsize in (
+            (manifest["row_file"], rows, 4 * self.dim),
+            (manifest["id_file"], ids, 8)
+        ):
+            with open(self._path(name), "ab") as f:
+                f.truncate(manifest["rows"] * itemsize)
+                f.write(np.ascontiguousarray(data).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _live_rows(self, manifest: dict) -> int:
+        return sum(n_students + n_samples for _, n_students, n_samples in manifest["classes"].values())
+
+    def _start_generation(self, manifest: dict) -> dict:
+        """Point the manifest at empty files of the next generation"""
+        generation = manifest["generation"] + 1
+        manifest = dict(
+            manifest,
+            generation=generation,
+            row_file=f"rows-{generation}.f32",
+            id_file=f"ids-{generation}.i64",
+            rows=0
+        )
+        for name in (manifest["row_file"], manifest["id_file"]):
+            open(self._path(name), "wb").close()
+        return manifest
+
+    def _compact(self, manifest: dict) -> dict:
+        """Copy live segments into a new generation and delete the old files"""
+        old_rows = np.memmap(self._path(manifest["row_file"]), dtype=np.float32, mode="r", shape=(manifest["rows"], self.dim))
+        old_ids = np.memmap(self._path(manifest["id_file"]), dtype=np.int64, mode="r", shape=(manifest["rows"],))
+        old_files = (manifest["row_file"], manifest["id_file"])
+
+        compacted = self._start_generation(manifest)
+        compacted["classes"] = {}
+        for class_id, (start, n_students, n_samples) in manifest["classes"].items():
+            stop = start + n_students + n_samples
+            new_start = compacted["rows"]
+            self._append(compacted, old_rows[start:stop], old_ids[start:stop])
+            compacted["classes"][class_id] = [new_start, n_students, n_samples]
+            compacted["rows"] = new_start + n_students + n_samples
+
+        del old_rows, old_ids
+        self._remove_files(old_files)
+        logger.info(f"Compacted embedding store to generation {compacted['generation']}")
+        return compacted
+
+    def _remove_files(self, names):
+        # Readers that still map the old files keep their pages until they remap
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path("store.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+embedding_store = EmbeddingStore()
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        embedding_store.rebuild(db)
@@ -1,6 +1,11 @@
 """Face Recognition Module"""
-from .face_detector import FaceDetector
+from .enrollment import EnrollmentPipeline, EnrollmentResult
+from .face_detector import DetectionStrategy, FaceDetector
 from .face_encoder import FaceEncoder
 from .face_matcher import FaceMatcher
+from .live_session import LiveSession
+from .worker_pool import RecognitionPool, RecognitionPoolBusy, recognition_pool
 
-__all__ = ['FaceDetector', 'FaceEncoder', 'FaceMatcher']
+__all__ = ['DetectionStrategy', 'EnrollmentPipeline', 'EnrollmentResult', 'FaceDetector',
+           'FaceEncoder', 'FaceMatcher', 'LiveSession',
+           'RecognitionPool', 'RecognitionPoolBusy', 'recognition_pool']
@@ -0,0 +1,177 @@
+"""
+Micro-batching of face encodings across concurrent requests
+
+Detection still runs per request on the recognition pool, but instead of
+encoding its faces there, each request hands the aligned face chips to the
+batcher. The first request to arrive opens a batch and leads it: it waits
+up to ENCODE_BATCH_MAX_WAIT_MS for chips from requests that are still in
+detection, then encodes the whole batch in one call on the pool and hands
+every request its slice of the results. A request that is alone in flight
+never waits. If the batched call fails (pool busy, worker died), each
+request encodes its own chips instead, so one failure is not handed to
+every request in the batch.
+
+Off by default (ENCODE_BATCH_MAX_SIZE=1): the batch runs on one worker
+where unbatched requests would encode on several, and each request makes
+a second pool round-trip. Compare with `python -m benchmarks --only
+batching` before turning it on.
+"""
+import threading
+import time
+
+from .. import metrics
+from ..config import settings
+from .tasks import detect_frame, encode_chips, encode_frame
+from .worker_pool import recognition_pool
+
+class _Batch:
+    def __init__(self):
+        self.opened_at = time.monotonic()
+        self.dispatched_at = None
+        self.chips = []
+        self.requests = 0
+        self.done = threading.Event()
+        self.encodings = None
+        self.encode_ms = 0.0
+        self.error = None
+
+class EncodingBatcher:
+    """Collects face chips from concurrent requests into batched encoder calls"""
+
+    def __init__(self, pool=None, max_batch: int = None, max_wait_ms: float = None):
+        self.pool = pool or recognition_pool
+        self.max_batch = settings.ENCODE_BATCH_MAX_SIZE if max_batch is None else max_batch
+        self.max_wait = (settings.ENCODE_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._cond = threading.Condition()
+        self._open = None
+        self._detecting = 0
+        self._batches = 0
+        self._faces = 0
+        self._largest = 0
+        self._wait_total = 0.0
+        self._fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 1
+
+    def recognize(self, image_data: bytes, region=None, skip_locations=None):
+        """
+        Detect on the pool, then encode in a shared batch; a drop-in for
+        recognition_pool.run(encode_frame, image_data, region, skip_locations)
+
+        Returns:
+            Tuple of (face_locations, encodings, timings); skipped faces
+            have None as encoding
+        """
+        if not self.enabled:
+            return self.pool.run(encode_frame, image_data, region, skip_locations)
+
+        with self._cond:
+            self._detecting += 1
+        try:
+            face_locations, chips, timings = self.pool.run(detect_frame, image_data, region, skip_locations)
+        except BaseException:
+            self._stop_detecting()
+            raise
+
+        to_encode = [i for i, chip in enumerate(chips) if chip is not None]
+        if not to_encode:
+            self._stop_detecting()
+            timings["encode_ms"] = 0.0
+            return face_locations, [None] * len(face_locations), timings
+
+        joined_at = time.monotonic()
+        computed, encode_ms, batch = self._join([chips[i] for i in to_encode])
+        encodings = [None] * len(face_locations)
+        for i, encoding in zip(to_encode, computed):
+            encodings[i] = encoding
+        timings["batch_wait_ms"] = max(0.0, (batch.dispatched_at - joined_at) * 1000)
+        timings["encode_ms"] = encode_ms
+        return face_locations, encodings, timings
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "batches": self._batches,
+                "faces": self._faces,
+                "avg_batch_size": round(self._faces / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._largest,
+                "avg_wait_ms": round(1000 * self._wait_total / self._batches, 2) if self._batches else 0.0,
+                "fallbacks": self._fallbacks
+            }
+
+    def _stop_detecting(self):
+        with self._cond:
+            self._detecting -= 1
+            self._cond.notify_all()
+
+    def _join(self, chips):
+        """
+        Add chips to the open batch (or open one) and wait for their encodings
+
+        Returns:
+            Tuple of (encodings of these chips, encode_ms, batch)
+        """
+        with self._cond:
+            self._detecting -= 1
+            batch = self._open
+            if batch is not None and len(batch.chips) + len(chips) > self.max_batch:
+                # Would overflow: let its leader dispatch it and start a new one
+                self._open = batch = None
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            start = len(batch.chips)
+            batch.chips.extend(chips)
+            batch.requests += 1
+            if len(batch.chips) >= self.max_batch:
+                self._open = None
+            self._cond.notify_all()
+
+            if leader:
+                # Wait for requests still in detection, up to the window
+                deadline = batch.opened_at + self.max_wait
+                while self._open is batch and self._detecting > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._open is batch:
+                    self._open = None
+
+        if leader:
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            if batch.requests == 1:
+                raise batch.error
+            # Encode alone; this call is admitted (or rejected) on its own
+            with self._cond:
+                self._fallbacks += 1
+            encodings, encode_ms = self.pool.run(encode_chips, chips)
+            return encodings, encode_ms, batch
+        return batch.encodings[start:start + len(chips)], batch.encode_ms, batch
+
+    def _run(self, batch: _Batch):
+        batch.dispatched_at = time.monotonic()
+        wait = batch.dispatched_at - batch.opened_at
+        with self._cond:
+            self._batches += 1
+            self._faces += len(batch.chips)
+            self._largest = max(self._largest, len(batch.chips))
+            self._wait_total += wait
+        metrics.ENCODE_BATCH_SIZE.observe(len(batch.chips))
+        metrics.ENCODE_BATCH_WAIT_SECONDS.observe(wait)
+        try:
+            batch.encodings, batch.encode_ms = self.pool.run(encode_chips, batch.chips)
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+encoding_batcher = EncodingBatcher()
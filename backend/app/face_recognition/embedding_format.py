@@ -0,0 +1,82 @@
+"""
+Versioned binary format for stored face encodings
+
+A blob is a 4-byte header followed by one or more rows:
+
+    marker (uint8) | dtype code (uint8) | dimension (uint16, little-endian)
+
+float64 and float32 rows are the raw little-endian values. int8 rows are a
+float32 scale followed by `dimension` int8 values; the encoding is
+value * scale, with scale = max(|x|) / 127 per row.
+
+Blobs written before the format existed are headerless float64 arrays and
+are still read.
+"""
+import struct
+import numpy as np
+from typing import Tuple
+
+HEADER = struct.Struct("<BBH")
+FORMAT_MARKER = 0xE1
+
+FLOAT64 = 1
+FLOAT32 = 2
+INT8 = 3
+
+DTYPE_CODES = {"float64": FLOAT64, "float32": FLOAT32, "int8": INT8}
+DTYPE_NAMES = {code: name for name, code in DTYPE_CODES.items()}
+
+def pack(encodings, dtype: str = "float32") -> bytes:
+    """Serialize an encoding or an (n, d) array of encodings"""
+    matrix = np.asarray(encodings, dtype=np.float64)
+    matrix = matrix.reshape(-1, matrix.shape[-1])
+    code = DTYPE_CODES[dtype]
+    header = HEADER.pack(FORMAT_MARKER, code, matrix.shape[1])
+
+    if code == FLOAT64:
+        return header + matrix.astype("<f8").tobytes()
+    if code == FLOAT32:
+        return header + matrix.astype("<f4").tobytes()
+
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    rows = np.empty(len(matrix), dtype=[("scale", "<f4"), ("values", "i1", matrix.shape[1])])
+    rows["scale"] = scales
+    rows["values"] = quantized
+    return header + rows.tobytes()
+
+def unpack(data: bytes, legacy_dim: int = 128) -> np.ndarray:
+    """
+    Deserialize into an (n, d) array
+
+    float64 blobs come back as float64; float32 and int8 blobs as float32,
+    the dtype matching runs in.
+    """
+    code, dim = describe(data, legacy_dim)
+    if code is None:
+        return np.frombuffer(data, dtype=np.float64).reshape(-1, legacy_dim)
+
+    payload = memoryview(data)[HEADER.size:]
+    if code == FLOAT64:
+        return np.frombuffer(payload, dtype="<f8").reshape(-1, dim)
+    if code == FLOAT32:
+        return np.frombuffer(payload, dtype="<f4").reshape(-1, dim)
+
+    rows = np.frombuffer(payload, dtype=[("scale", "<f4"), ("values", "i1", dim)])
+    return rows["values"].astype(np.float32) * rows["scale"][:, None]
+
+def describe(data: bytes, legacy_dim: int = 128) -> Tuple[int, int]:
+    """(dtype code, dimension) of a blob, or (None, legacy_dim) if it has no header"""
+    if len(data) >= HEADER.size:
+        marker, code, dim = HEADER.unpack_from(data)
+        if marker == FORMAT_MARKER and code in DTYPE_NAMES and dim:
+            row_size = {FLOAT64: 8 * dim, FLOAT32: 4 * dim, INT8: 4 + dim}[code]
+            if (len(data) - HEADER.size) % row_size == 0:
+                return code, dim
+    return None, legacy_dim
+
+def max_error(original, data: bytes) -> float:
+    """Largest Euclidean distance between the original encodings and their stored form"""
+    original = np.asarray(original, dtype=np.float64).reshape(-1, unpack(data).shape[1])
+    return float(np.linalg.norm(unpack(data).astype(np.float64) - original, axis=1).max())
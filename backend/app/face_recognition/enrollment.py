@@ -0,0 +1,85 @@
+import face_recognition
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+from .face_detector import FaceDetector
+
+@dataclass
+class EnrollmentResult:
+    """Outcome of one enrollment photo"""
+    valid: bool
+    message: str
+    location: Optional[Tuple[int, int, int, int]] = None  # (top, right, bottom, left)
+    quality: dict = field(default_factory=dict)
+    encoding: Optional[np.ndarray] = None
+    crop: Optional[np.ndarray] = None
+    timings: dict = field(default_factory=dict)  # stage -> milliseconds
+
+class EnrollmentPipeline:
+    """
+    Decodes an enrollment photo once, detects once, checks quality and
+    encodes from the same face location
+    """
+
+    @staticmethod
+    def process_bytes(image_data: bytes) -> EnrollmentResult:
+        """
+        Run the pipeline on encoded image bytes
+
+        Raises:
+            ValueError: if the image cannot be decoded
+        """
+        started = time.perf_counter()
+        image = FaceDetector.bytes_to_image(image_data)
+        decode_ms = (time.perf_counter() - started) * 1000
+
+        result = EnrollmentPipeline.process(image)
+        result.timings["decode_ms"] = decode_ms
+        return result
+
+    @staticmethod
+    def process(image: np.ndarray) -> EnrollmentResult:
+        """
+        Run the pipeline on a decoded RGB image
+
+        Returns:
+            EnrollmentResult; encoding and crop are set only when valid
+        """
+        started = time.perf_counter()
+        quality_check = FaceDetector.check_face_quality(image)
+        location = quality_check.get("location")
+        timings = {"detect_ms": (time.perf_counter() - started) * 1000}
+
+        if not quality_check["valid"]:
+            return EnrollmentResult(
+                valid=False,
+                message=quality_check["message"],
+                location=location,
+                quality=quality_check["metrics"],
+                timings=timings
+            )
+
+        # Encode from the location the quality check already found
+        started = time.perf_counter()
+        encodings = face_recognition.face_encodings(image, [location])
+        timings["encode_ms"] = (time.perf_counter() - started) * 1000
+        if len(encodings) == 0:
+            return EnrollmentResult(
+                valid=False,
+                message="Could not generate face encoding",
+                location=location,
+                quality=quality_check["metrics"],
+                timings=timings
+            )
+
+        top, right, bottom, left = location
+        return EnrollmentResult(
+            valid=True,
+            message=quality_check["message"],
+            location=location,
+            quality=quality_check["metrics"],
+            encoding=encodings[0],
+            crop=image[top:bottom, left:right],
+            timings=timings
+        )
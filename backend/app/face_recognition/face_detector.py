@@ -4,6 +4,40 @@ import base64
 from io import BytesIO
 from PIL import Image
 import cv2
+import time
+from ..config import settings
+
+class DetectionStrategy:
+    """
+    How a frame is scaled and searched for faces
+    
+    The frame is resized so HOG runs at about target_width pixels wide:
+    large camera frames are downscaled, small webcam frames upscaled so
+    distant faces reach the detector's minimum size. With refine enabled,
+    faces found on a downscaled frame are re-detected at full resolution
+    inside a margin around each box, so locations stay precise.
+    """
+    
+    def __init__(
+        self,
+        target_width: int = None,
+        min_scale: float = None,
+        max_scale: float = None,
+        refine: bool = None,
+        refine_margin: float = None,
+        upsample: int = None
+    ):
+        self.target_width = target_width or settings.DETECTION_TARGET_WIDTH
+        self.min_scale = settings.DETECTION_MIN_SCALE if min_scale is None else min_scale
+        self.max_scale = settings.DETECTION_MAX_SCALE if max_scale is None else max_scale
+        self.refine = settings.DETECTION_REFINE if refine is None else refine
+        self.refine_margin = settings.DETECTION_REFINE_MARGIN if refine_margin is None else refine_margin
+        self.upsample = settings.DETECTION_UPSAMPLE if upsample is None else upsample
+    
+    def scale_for(self, width: int) -> float:
+        """Resize factor that brings a frame of this width to target_width"""
+        scale = self.target_width / float(width)
+        return min(self.max_scale, max(self.min_scale, scale))
 
 class FaceDetector:
     """Handles face detection in images"""
@@ -11,11 +45,34 @@ class FaceDetector:
     @staticmethod
     def base64_to_image(base64_string: str) -> np.ndarray:
         """Convert base64 string to numpy array image"""
+        return FaceDetector.bytes_to_image(FaceDetector.base64_to_bytes(base64_string))
+    
+    @staticmethod
+    def base64_to_bytes(base64_string: str) -> bytes:
+        """Convert a base64 string or data URL to the encoded image bytes"""
         try:
             if "," in base64_string:
                 base64_string = base64_string.split(",")[1]
             
-            image_data = base64.b64decode(base64_string)
+            return base64.b64decode(base64_string)
+        except Exception as e:
+            raise ValueError(f"Failed to decode base64 image: {str(e)}")
+    
+    @staticmethod
+    def bytes_to_image(image_data) -> np.ndarray:
+        """
+        Convert encoded image bytes (JPEG, PNG, ...) to an RGB numpy array
+        
+        The buffer is wrapped without copying and decoded directly by OpenCV;
+        formats OpenCV cannot read fall back to PIL.
+        """
+        try:
+            buffer = np.frombuffer(image_data, dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            
+            if image is not None:
+                return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            
             image = Image.open(BytesIO(image_data))
             
             if image.mode != 'RGB':
@@ -23,7 +80,27 @@ class FaceDetector:
             
             return np.array(image)
         except Exception as e:
-            raise ValueError(f"Failed to decode base64 image: {str(e)}")
+            raise ValueError(f"Failed to decode image: {str(e)}")
+    
+    @staticmethod
+    def bytes_to_gray_thumbnail(image_data, size):
+        """
+        Decode encoded image bytes straight to a small grayscale array
+        
+        JPEGs are decoded at a reduced DCT scale, which skips most of the
+        work of a full decode.
+        
+        Returns:
+            Tuple of (int16 array of shape (height, width), full (width, height))
+        """
+        try:
+            image = Image.open(BytesIO(image_data))
+            full_size = image.size
+            image.draft("L", (size[0] * 4, size[1] * 4))
+            small = image.convert("L").resize(size, Image.BILINEAR)
+            return np.asarray(small, dtype=np.int16), full_size
+        except Exception as e:
+            raise ValueError(f"Failed to decode image: {str(e)}")
     
     @staticmethod
     def image_to_base64(image: np.ndarray) -> str:
@@ -36,6 +113,26 @@ class FaceDetector:
         except Exception as e:
             raise ValueError(f"Failed to encode image to base64: {str(e)}")
     
+    @staticmethod
+    def image_to_thumbnail(image: np.ndarray, max_size: int = None, image_format: str = None):
+        """
+        Encode an RGB image as a small JPEG/WebP thumbnail
+        
+        Returns:
+            Tuple of (thumbnail_bytes, width, height)
+        """
+        max_size = max_size or settings.THUMBNAIL_MAX_SIZE
+        image_format = image_format or settings.THUMBNAIL_FORMAT
+        
+        try:
+            pil_image = Image.fromarray(image)
+            pil_image.thumbnail((max_size, max_size))
+            buffered = BytesIO()
+            pil_image.save(buffered, format=image_format, quality=settings.THUMBNAIL_QUALITY)
+            return buffered.getvalue(), pil_image.width, pil_image.height
+        except Exception as e:
+            raise ValueError(f"Failed to encode thumbnail: {str(e)}")
+    
     @staticmethod
     def detect_faces(image: np.ndarray, model: str = "hog"):
         """
@@ -50,6 +147,106 @@ class FaceDetector:
         """
         return face_recognition.face_locations(image, model=model)
     
+    @staticmethod
+    def detect_faces_adaptive(image: np.ndarray, strategy: DetectionStrategy = None):
+        """
+        Detect faces with a resolution-dependent scale and optional refinement
+        
+        Args:
+            image: numpy array image (full resolution)
+            strategy: DetectionStrategy (default from config)
+        
+        Returns:
+            Tuple of (face_locations, timings) where face_locations are in
+            full-resolution coordinates and timings maps stage to milliseconds
+        """
+        strategy = strategy or DetectionStrategy()
+        timings = {}
+        height, width = image.shape[:2]
+        scale = strategy.scale_for(width)
+        
+        started = time.perf_counter()
+        if scale == 1.0:
+            scaled = image
+        else:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            scaled = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=interpolation)
+        timings["resize_ms"] = (time.perf_counter() - started) * 1000
+        
+        started = time.perf_counter()
+        coarse = face_recognition.face_locations(scaled, number_of_times_to_upsample=strategy.upsample)
+        timings["detect_ms"] = (time.perf_counter() - started) * 1000
+        
+        face_locations = [
+            FaceDetector._scale_location(location, 1.0 / scale, height, width)
+            for location in coarse
+        ]
+        
+        if strategy.refine and scale < 1.0 and face_locations:
+            started = time.perf_counter()
+            face_locations = FaceDetector._refine_locations(image, face_locations, strategy.refine_margin)
+            timings["refine_ms"] = (time.perf_counter() - started) * 1000
+        
+        return face_locations, timings
+    
+    @staticmethod
+    def _scale_location(location, factor: float, height: int, width: int):
+        top, right, bottom, left = location
+        return (
+            max(0, int(round(top * factor))),
+            min(width, int(round(right * factor))),
+            min(height, int(round(bottom * factor))),
+            max(0, int(round(left * factor)))
+        )
+    
+    @staticmethod
+    def _refine_locations(image: np.ndarray, face_locations, margin: float):
+        """Re-detect each coarse face at full resolution within a margin around it"""
+        height, width = image.shape[:2]
+        refined = []
+        
+        for top, right, bottom, left in face_locations:
+            pad_y = int((bottom - top) * margin)
+            pad_x = int((right - left) * margin)
+            y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+            x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+            
+            found = face_recognition.face_locations(
+                image[y0:y1, x0:x1], number_of_times_to_upsample=0
+            )
+            if not found:
+                # Full-resolution HOG can miss what the coarse pass saw; keep it
+                refined.append((top, right, bottom, left))
+                continue
+            
+            refined.extend(
+                (t + y0, r + x0, b + y0, l + x0) for t, r, b, l in found
+            )
+        
+        return FaceDetector._suppress_overlaps(refined)
+    
+    @staticmethod
+    def _suppress_overlaps(face_locations, threshold: float = 0.5):
+        """Drop boxes that overlap a larger box by more than threshold IoU"""
+        def area(location):
+            top, right, bottom, left = location
+            return max(0, bottom - top) * max(0, right - left)
+        
+        kept = []
+        for location in sorted(face_locations, key=area, reverse=True):
+            top, right, bottom, left = location
+            duplicate = False
+            for k_top, k_right, k_bottom, k_left in kept:
+                inter = max(0, min(bottom, k_bottom) - max(top, k_top)) * \
+                    max(0, min(right, k_right) - max(left, k_left))
+                union = area(location) + area((k_top, k_right, k_bottom, k_left)) - inter
+                if union and inter / union > threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(location)
+        return kept
+    
     @staticmethod
     def detect_single_face(base64_image: str):
         """
@@ -93,42 +290,72 @@ class FaceDetector:
         Verify if the image has good quality for face recognition
         
         Returns:
-            dict with 'valid' and 'message' keys
+            dict with 'valid', 'message' and 'metrics' keys
         """
         image = FaceDetector.base64_to_image(base64_image)
+        return FaceDetector.check_face_quality(image)
+    
+    @staticmethod
+    def check_face_quality(image: np.ndarray) -> dict:
+        """
+        Verify if a decoded RGB image has good quality for face recognition
         
+        Returns:
+            dict with 'valid', 'message' and 'metrics' keys, plus 'location'
+            (top, right, bottom, left) of the face when exactly one is found
+        """
         height, width = image.shape[:2]
+        metrics = {"image_width": width, "image_height": height}
+        
         if width < 200 or height < 200:
             return {
                 "valid": False,
-                "message": "Image resolution too low. Please ensure good lighting and camera quality."
+                "message": "Image resolution too low. Please ensure good lighting and camera quality.",
+                "metrics": metrics
             }
         
         face_locations = FaceDetector.detect_faces(image)
+        metrics["faces_detected"] = len(face_locations)
         
         if len(face_locations) == 0:
             return {
                 "valid": False,
-                "message": "No face detected. Please ensure your face is clearly visible."
+                "message": "No face detected. Please ensure your face is clearly visible.",
+                "metrics": metrics
             }
         
         if len(face_locations) > 1:
             return {
                 "valid": False,
-                "message": "Multiple faces detected. Only one person should be in frame."
+                "message": "Multiple faces detected. Only one person should be in frame.",
+                "metrics": metrics
             }
         
-        top, right, bottom, left = face_locations[0]
+        location = face_locations[0]
+        top, right, bottom, left = location
         face_width = right - left
         face_height = bottom - top
         
+        # Brightness and sharpness of the face region, reported for the client
+        face_gray = cv2.cvtColor(image[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+        metrics.update({
+            "face_width": face_width,
+            "face_height": face_height,
+            "brightness": round(float(face_gray.mean()), 2),
+            "sharpness": round(float(cv2.Laplacian(face_gray, cv2.CV_64F).var()), 2)
+        })
+        
         if face_width < 80 or face_height < 80:
             return {
                 "valid": False,
-                "message": "Face too small. Please move closer to the camera."
+                "message": "Face too small. Please move closer to the camera.",
+                "metrics": metrics,
+                "location": location
             }
         
         return {
             "valid": True,
-            "message": "Face quality is good"
+            "message": "Face quality is good",
+            "metrics": metrics,
+            "location": location
         }
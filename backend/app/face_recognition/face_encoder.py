@@ -1,6 +1,12 @@
+import dlib
 import face_recognition
 import numpy as np
-from .face_detector import FaceDetector
+from face_recognition import api as face_recognition_api
+import time
+from . import embedding_format
+from .face_detector import DetectionStrategy, FaceDetector
+from .tracker import iou_matrix
+from ..config import settings
 
 class FaceEncoder:
     """Handles face encoding (embedding generation)"""
@@ -14,6 +20,16 @@ class FaceEncoder:
             Tuple of (encoding, face_image)
         """
         image = FaceDetector.base64_to_image(base64_image)
+        return FaceEncoder.generate_encoding_from_image(image)
+    
+    @staticmethod
+    def generate_encoding_from_image(image: np.ndarray):
+        """
+        Generate face encoding from a decoded RGB image
+        
+        Returns:
+            Tuple of (encoding, face_image)
+        """
         face_locations = face_recognition.face_locations(image)
         
         if len(face_locations) == 0:
@@ -42,25 +58,123 @@ class FaceEncoder:
             List of encodings
         """
         image = FaceDetector.base64_to_image(base64_frame)
+        return FaceEncoder.generate_encodings_from_image(image)
+    
+    @staticmethod
+    def generate_encodings_from_image(image: np.ndarray):
+        """
+        Generate encodings for all faces in a decoded RGB image
         
-        # Resize for faster processing
-        import cv2
-        small_frame = cv2.resize(image, (0, 0), fx=0.5, fy=0.5)
+        Returns:
+            List of encodings
+        """
+        _, encodings, _ = FaceEncoder.encode_frame(image)
+        return encodings
+    
+    @staticmethod
+    def encode_frame(
+        image: np.ndarray,
+        strategy: DetectionStrategy = None,
+        skip_locations=None,
+        skip_iou: float = None
+    ):
+        """
+        Detect faces with the adaptive strategy and encode them from the
+        full-resolution image
         
-        face_locations = face_recognition.face_locations(small_frame)
+        Args:
+            image: Decoded RGB image
+            strategy: Detection strategy (default from config)
+            skip_locations: Boxes of faces that are already identified; a
+                detection overlapping one by at least skip_iou is located
+                but not encoded
+            skip_iou: IoU threshold for skip_locations (default
+                TRACK_IOU_THRESHOLD)
+        
+        Returns:
+            Tuple of (face_locations, encodings, timings) where timings maps
+            stage to milliseconds; skipped faces have None as encoding
+        """
+        face_locations, timings = FaceDetector.detect_faces_adaptive(image, strategy)
         
         if len(face_locations) == 0:
-            return []
+            timings["encode_ms"] = 0.0
+            return [], [], timings
         
-        encodings = face_recognition.face_encodings(small_frame, face_locations)
-        return encodings
+        encode_indices = FaceEncoder._indices_to_encode(face_locations, skip_locations, skip_iou)
+        
+        started = time.perf_counter()
+        encodings = [None] * len(face_locations)
+        if encode_indices:
+            computed = face_recognition.face_encodings(image, [face_locations[i] for i in encode_indices])
+            for i, encoding in zip(encode_indices, computed):
+                encodings[i] = encoding
+        timings["encode_ms"] = (time.perf_counter() - started) * 1000
+        
+        return face_locations, encodings, timings
+    
+    @staticmethod
+    def detect_chips(
+        image: np.ndarray,
+        strategy: DetectionStrategy = None,
+        skip_locations=None,
+        skip_iou: float = None
+    ):
+        """
+        Detect faces like encode_frame, but return the aligned 150x150 face
+        chips the encoder network takes instead of encoding them, so chips
+        from several frames can be encoded together with encode_chips()
+        
+        Returns:
+            Tuple of (face_locations, chips, timings); skipped faces have
+            None as chip
+        """
+        face_locations, timings = FaceDetector.detect_faces_adaptive(image, strategy)
+        
+        started = time.perf_counter()
+        chips = [None] * len(face_locations)
+        for i in FaceEncoder._indices_to_encode(face_locations, skip_locations, skip_iou):
+            # Same landmarks and alignment face_recognition.face_encodings uses
+            top, right, bottom, left = face_locations[i]
+            shape = face_recognition_api.pose_predictor_5_point(image, dlib.rectangle(left, top, right, bottom))
+            chips[i] = dlib.get_face_chip(image, shape, size=150, padding=0.25)
+        timings["chip_ms"] = (time.perf_counter() - started) * 1000
+        
+        return face_locations, chips, timings
+    
+    @staticmethod
+    def encode_chips(chips) -> list:
+        """Encode aligned face chips in one batched pass through the network"""
+        if len(chips) == 0:
+            return []
+        descriptors = face_recognition_api.face_encoder.compute_face_descriptor(list(chips))
+        return [np.array(descriptor) for descriptor in descriptors]
+    
+    @staticmethod
+    def _indices_to_encode(face_locations, skip_locations=None, skip_iou: float = None) -> list:
+        """Indices of the detections that do not overlap a skip location"""
+        if not skip_locations or len(face_locations) == 0:
+            return list(range(len(face_locations)))
+        iou = iou_matrix(face_locations, skip_locations)
+        threshold = settings.TRACK_IOU_THRESHOLD if skip_iou is None else skip_iou
+        return np.flatnonzero(iou.max(axis=1) < threshold).tolist()
     
     @staticmethod
-    def encoding_to_bytes(encoding: np.ndarray) -> bytes:
-        """Convert numpy encoding to bytes for storage"""
-        return encoding.tobytes()
+    def encoding_to_bytes(encoding: np.ndarray, dtype: str = None) -> bytes:
+        """Convert numpy encoding to bytes for storage (see embedding_format)"""
+        return embedding_format.pack(encoding, dtype or settings.EMBEDDING_DTYPE)
     
     @staticmethod
     def bytes_to_encoding(encoding_bytes: bytes) -> np.ndarray:
         """Convert bytes back to numpy encoding"""
-        return np.frombuffer(encoding_bytes, dtype=np.float64)
+        return embedding_format.unpack(encoding_bytes)[0]
+    
+    @staticmethod
+    def encodings_to_bytes(encodings, dtype: str = None) -> bytes:
+        """Pack a sequence of encodings into one (n, d) array for storage"""
+        return embedding_format.pack(np.vstack(encodings), dtype or settings.EMBEDDING_DTYPE)
+    
+    @staticmethod
+    def bytes_to_encodings(encodings_bytes: bytes) -> np.ndarray:
+        """Unpack stored encodings into an (n, d) array"""
+        return embedding_format.unpack(encodings_bytes)
@@ -6,6 +6,183 @@ from ..config import settings
 class FaceMatcher:
     """Handles face matching and recognition"""
     
+    @staticmethod
+    def distance_matrix(
+        detected_encodings,
+        known_matrix: np.ndarray
+    ) -> np.ndarray:
+        """
+        Calculate distances between every detected and every known encoding
+        
+        Args:
+            detected_encodings: List or (n, d) array of detected face encodings
+            known_matrix: (m, d) array of known face encodings
+        
+        Returns:
+            (n, m) array of Euclidean distances
+        """
+        known_matrix = np.asarray(known_matrix)
+        detected = np.asarray(detected_encodings, dtype=known_matrix.dtype)
+        detected = detected.reshape(-1, known_matrix.shape[1])
+        
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab, computed for all pairs at once
+        squared = (
+            np.einsum("ij,ij->i", detected, detected)[:, None]
+            + np.einsum("ij,ij->i", known_matrix, known_matrix)[None, :]
+            - 2.0 * (detected @ known_matrix.T)
+        )
+        np.maximum(squared, 0.0, out=squared)
+        return np.sqrt(squared, out=squared)
+    
+    @staticmethod
+    def assign_matches(
+        distances: np.ndarray,
+        tolerance: float
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Greedily assign detected faces to known faces, lowest distance first
+        
+        Each detected face and each known face is used at most once.
+        
+        Args:
+            distances: (n_detected, n_known) distance matrix
+            tolerance: Distance threshold
+        
+        Returns:
+            List of tuples (detected_index, known_index, distance)
+        """
+        rows, cols = np.nonzero(distances <= tolerance)
+        if len(rows) == 0:
+            return []
+        
+        order = np.argsort(distances[rows, cols], kind="stable")
+        used_rows = set()
+        used_cols = set()
+        assignments = []
+        
+        for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+            if row in used_rows or col in used_cols:
+                continue
+            used_rows.add(row)
+            used_cols.add(col)
+            assignments.append((row, col, float(distances[row, col])))
+        
+        assignments.sort()
+        return assignments
+    
+    @staticmethod
+    def match_faces_batch(
+        detected_encodings,
+        known_matrix: np.ndarray,
+        student_ids,
+        tolerance: float = None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Match detected face encodings against a class-wide encoding matrix
+        
+        Args:
+            detected_encodings: List or (n, d) array of detected face encodings
+            known_matrix: (m, d) array of known face encodings
+            student_ids: Sequence of m student IDs, aligned with known_matrix rows
+            tolerance: Distance threshold (default from config)
+        
+        Returns:
+            List of tuples (detected_index, student_id, distance) ordered by
+            detected_index; unmatched faces are omitted
+        """
+        if tolerance is None:
+            tolerance = settings.FACE_MATCH_TOLERANCE
+        
+        if len(detected_encodings) == 0 or len(student_ids) == 0:
+            return []
+        
+        distances = FaceMatcher.distance_matrix(detected_encodings, known_matrix)
+        
+        return [
+            (row, int(student_ids[col]), distance)
+            for row, col, distance in FaceMatcher.assign_matches(distances, tolerance)
+        ]
+    
+    @staticmethod
+    def sample_distance_matrix(
+        detected_encodings,
+        centroids: np.ndarray,
+        samples: np.ndarray,
+        sample_offsets: np.ndarray,
+        radii: np.ndarray,
+        tolerance: float
+    ) -> np.ndarray:
+        """
+        Distance from every detected face to the closest sample of every student
+        
+        Centroid distances prune the search: by the triangle inequality no
+        sample of a student can be closer than its centroid distance minus
+        its radius, so students that cannot be within tolerance keep an
+        infinite distance and their samples are never compared.
+        
+        Args:
+            detected_encodings: List or (n, d) array of detected face encodings
+            centroids: (m, d) array of per-student centroids
+            samples: (s, d) array of all samples, grouped by student
+            sample_offsets: (m + 1,) array; student j owns
+                samples[sample_offsets[j]:sample_offsets[j + 1]]
+            radii: (m,) array of the largest sample-to-centroid distance
+            tolerance: Distance threshold
+        
+        Returns:
+            (n, m) array of min-over-samples distances (inf where pruned)
+        """
+        centroid_distances = FaceMatcher.distance_matrix(detected_encodings, centroids)
+        candidates = centroid_distances - radii[None, :] <= tolerance
+        distances = np.full(centroid_distances.shape, np.inf)
+        
+        columns = np.flatnonzero(candidates.any(axis=0))
+        if len(columns) == 0:
+            return distances
+        
+        # Gather the candidate students' samples into consecutive segments
+        starts = sample_offsets[columns]
+        counts = sample_offsets[columns + 1] - starts
+        segment_starts = np.cumsum(counts) - counts
+        sample_rows = np.repeat(starts - segment_starts, counts) + np.arange(counts.sum())
+        
+        per_sample = FaceMatcher.distance_matrix(detected_encodings, samples[sample_rows])
+        nearest = np.minimum.reduceat(per_sample, segment_starts, axis=1)
+        
+        distances[:, columns] = np.where(candidates[:, columns], nearest, np.inf)
+        return distances
+    
+    @staticmethod
+    def match_faces_samples(
+        detected_encodings,
+        centroids: np.ndarray,
+        samples: np.ndarray,
+        sample_offsets: np.ndarray,
+        radii: np.ndarray,
+        student_ids,
+        tolerance: float = None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Match detected faces against students enrolled with several samples
+        
+        Same contract as match_faces_batch, but a face matches a student when
+        it is within tolerance of any of the student's samples.
+        """
+        if tolerance is None:
+            tolerance = settings.FACE_MATCH_TOLERANCE
+        
+        if len(detected_encodings) == 0 or len(student_ids) == 0:
+            return []
+        
+        distances = FaceMatcher.sample_distance_matrix(
+            detected_encodings, centroids, samples, sample_offsets, radii, tolerance
+        )
+        
+        return [
+            (row, int(student_ids[col]), distance)
+            for row, col, distance in FaceMatcher.assign_matches(distances, tolerance)
+        ]
+    
     @staticmethod
     def match_faces(
         detected_encodings: List[np.ndarray],
@@ -23,25 +200,16 @@ class FaceMatcher:
         Returns:
             List of matched student IDs
         """
-        if tolerance is None:
-            tolerance = settings.FACE_MATCH_TOLERANCE
+        if len(detected_encodings) == 0 or len(known_encodings) == 0:
+            return []
+        
+        student_ids = [student_id for student_id, _ in known_encodings]
+        known_matrix = np.vstack([encoding for _, encoding in known_encodings])
         
-        matched_student_ids = []
-        
-        for detected_encoding in detected_encodings:
-            for student_id, known_encoding in known_encodings:
-                # Calculate face distance
-                distance = face_recognition.face_distance(
-                    [known_encoding], 
-                    detected_encoding
-                )[0]
-                
-                if distance <= tolerance:
-                    if student_id not in matched_student_ids:
-                        matched_student_ids.append(student_id)
-                    break
-        
-        return matched_student_ids
+        matches = FaceMatcher.match_faces_batch(
+            detected_encodings, known_matrix, student_ids, tolerance
+        )
+        return [student_id for _, student_id, _ in matches]
     
     @staticmethod
     def compare_faces(
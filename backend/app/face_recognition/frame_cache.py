@@ -0,0 +1,121 @@
+"""
+Bounded cache of recognition results for repeated frames
+
+Frames are keyed by a hash of their encoded bytes, so only byte-identical
+resubmissions (client retries, duplicate uploads) hit, without decoding
+anything. Near-identical frames are deliberately not reused: a small
+perceptual hash cannot tell one face from another at the same seat, and a
+live stream's motion gate already skips frames that did not change.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .. import metrics
+from ..config import settings
+from .batching import encoding_batcher
+
+
+class FrameCache:
+    """
+    LRU + TTL cache from frame bytes to (face_locations, encodings)
+
+    Results are shared across classes: encodings of the same bytes do not
+    depend on which class they are matched against.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = settings.FRAME_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = settings.FRAME_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # content hash -> (locations, encodings, stored_at)
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, image_data: bytes):
+        """
+        Cached result for a frame
+
+        Returns:
+            Tuple of (result, key) where result is (face_locations,
+            encodings) or None, and key is what to pass to store() after
+            computing a missed result
+        """
+        digest = hashlib.blake2b(image_data, digest_size=16).digest()
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._hits += 1
+                metrics.FRAME_CACHE_LOOKUPS.inc(result="hit")
+                return (list(entry[0]), list(entry[1])), digest
+            self._misses += 1
+        metrics.FRAME_CACHE_LOOKUPS.inc(result="miss")
+        return None, digest
+
+    def store(self, key, face_locations, encodings):
+        with self._lock:
+            self._entries[key] = (list(face_locations), list(encodings), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0
+            }
+
+    def _expire(self, now: float):
+        # Entries are in LRU order, not insertion order, so scan them all
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry[2] > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+
+
+frame_cache = FrameCache()
+
+
+def recognize_frame(image_data: bytes):
+    """
+    Face locations and encodings of an encoded frame, from the frame cache
+    or else the recognition pool (encodings batched across requests)
+
+    Returns:
+        Tuple of (face_locations, encodings, timings); on a cache hit
+        timings only has hash_ms
+    """
+    if not frame_cache.enabled:
+        return encoding_batcher.recognize(image_data)
+
+    started = time.perf_counter()
+    cached, key = frame_cache.lookup(image_data)
+    hash_ms = (time.perf_counter() - started) * 1000
+    if cached is not None:
+        face_locations, encodings = cached
+        return face_locations, encodings, {"hash_ms": hash_ms}
+
+    face_locations, encodings, timings = encoding_batcher.recognize(image_data)
+    frame_cache.store(key, face_locations, encodings)
+    timings["hash_ms"] = hash_ms
+    return face_locations, encodings, timings
@@ -0,0 +1,120 @@
+import time
+from typing import List
+from .. import metrics
+from ..config import settings
+from .batching import encoding_batcher
+from .frame_cache import recognize_frame
+from .motion_gate import FULL, REGION, STATIC, GateDecision, MotionGate
+from .tracker import FaceTracker
+
+def _overlaps(box, region) -> bool:
+    top, right, bottom, left = box
+    region_top, region_right, region_bottom, region_left = region
+    return top < region_bottom and region_top < bottom and left < region_right and region_left < right
+
+class LiveSession:
+    """Accumulates recognized students across the frames of one scanning session"""
+
+    def __init__(
+        self,
+        index,
+        tolerance: float = None,
+        gate: MotionGate = None,
+        tracker: FaceTracker = None
+    ):
+        """
+        Args:
+            index: Class embedding index, kept resident; anything with a
+                match(detected_encodings, tolerance) method returning
+                (detected_index, student_id, distance) tuples
+            tolerance: Distance threshold (default from config)
+            gate: Change detector for the stream (default: a MotionGate
+                when MOTION_GATING is on, else every frame is recognized)
+            tracker: Face tracker for the stream (default: a FaceTracker;
+                with FACE_TRACKING off it never skips encoding)
+        """
+        self.index = index
+        self.tolerance = tolerance
+        self.gate = gate if gate is not None else (MotionGate() if settings.MOTION_GATING else None)
+        self.present_ids = set()
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.last_faces_detected = 0
+        self.last_timings = {}
+        self.last_mode = FULL
+        self.last_faces_tracked = 0
+        if tracker is None:
+            tracker = FaceTracker(reverify_frames=None if settings.FACE_TRACKING else 0)
+        self.tracker = tracker
+
+    def process_frame(self, image_data: bytes) -> List[int]:
+        """
+        Recognize faces in one encoded frame and accumulate presence
+
+        Static frames are skipped and keep the faces already in view; when
+        only part of the frame changed, only that part is searched and
+        faces elsewhere keep their identities. Faces on a confidently
+        identified track are located but not re-encoded.
+
+        Returns:
+            List of student IDs seen for the first time in this session
+        """
+        gate_started = time.perf_counter()
+        decision = self.gate.check(image_data) if self.gate is not None else GateDecision(FULL)
+        gate_ms = (time.perf_counter() - gate_started) * 1000
+        self.last_mode = decision.mode
+        metrics.LIVE_FRAMES.inc(mode=decision.mode)
+
+        if decision.mode == STATIC:
+            self.frames_skipped += 1
+            self.last_timings = {"gate_ms": gate_ms}
+            return []
+
+        region = None
+        if decision.mode == REGION:
+            # Grow the region over faces it cuts through so they are re-detected whole
+            region = decision.region
+            for track in self.tracker.tracks:
+                if track.misses == 0 and _overlaps(track.location, region):
+                    location = track.location
+                    region = (
+                        min(region[0], location[0]), max(region[1], location[1]),
+                        max(region[2], location[2]), min(region[3], location[3])
+                    )
+
+        skip_locations = self.tracker.skip_locations()
+        if region is None and not skip_locations:
+            face_locations, encodings, timings = recognize_frame(image_data)
+        else:
+            face_locations, encodings, timings = encoding_batcher.recognize(image_data, region, skip_locations)
+
+        timings["gate_ms"] = gate_ms
+        self.frames_processed += 1
+        self.last_timings = timings
+
+        tracks = self.tracker.update(face_locations, region)
+        encoded = [i for i, encoding in enumerate(encodings) if encoding is not None]
+
+        match_started = time.perf_counter()
+        matches = self.index.match([encodings[i] for i in encoded], self.tolerance)
+        timings["match_ms"] = (time.perf_counter() - match_started) * 1000
+
+        matched = {encoded[match_index]: (student_id, distance) for match_index, student_id, distance in matches}
+        for i in encoded:
+            self.tracker.verify(tracks[i], *matched.get(i, (None, None)))
+
+        tracked = len(face_locations) - len(encoded)
+        self.last_faces_tracked = tracked
+        self.last_faces_detected = sum(1 for track in self.tracker.tracks if track.misses == 0)
+        metrics.observe_timings("live", timings)
+        metrics.observe_frame("live", len(face_locations), len(matches) + tracked)
+        metrics.LIVE_FACES.inc(len(encoded), result="encoded")
+        metrics.LIVE_FACES.inc(tracked, result="tracked")
+
+        newly_present = []
+        for student_id, _ in matched.values():
+            if student_id not in self.present_ids:
+                self.present_ids.add(student_id)
+                newly_present.append(student_id)
+
+        return newly_present
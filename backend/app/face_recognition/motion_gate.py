@@ -0,0 +1,117 @@
+"""
+Change detection in front of face detection for streamed frames
+
+Each frame is decoded to a small grayscale thumbnail and compared with the
+last frame that was actually recognized. Frames that barely differ are
+skipped outright; frames where only part of the scene changed are
+recognized inside the changed region alone.
+"""
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from ..config import settings
+from .face_detector import FaceDetector
+
+STATIC = "static"
+REGION = "region"
+FULL = "full"
+
+def _setting(value, default):
+    return default if value is None else value
+
+@dataclass
+class GateDecision:
+    """What to recognize in a frame"""
+    mode: str  # STATIC, REGION or FULL
+    region: Optional[Tuple[int, int, int, int]] = None  # (top, right, bottom, left), full-frame pixels
+    changed_fraction: float = 0.0
+
+class MotionGate:
+    """
+    Per-stream change detector
+
+    The reference thumbnail only moves forward when a frame is recognized,
+    so slow drift across many skipped frames still adds up to a change.
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = None,
+        pixel_threshold: int = None,
+        min_changed_fraction: float = None,
+        max_region_fraction: float = None,
+        region_margin: float = None,
+        max_skipped_frames: int = None
+    ):
+        self.size = size or (settings.MOTION_THUMBNAIL_WIDTH, settings.MOTION_THUMBNAIL_HEIGHT)
+        self.pixel_threshold = _setting(pixel_threshold, settings.MOTION_PIXEL_THRESHOLD)
+        self.min_changed_fraction = _setting(min_changed_fraction, settings.MOTION_MIN_CHANGED_FRACTION)
+        self.max_region_fraction = _setting(max_region_fraction, settings.MOTION_MAX_REGION_FRACTION)
+        self.region_margin = _setting(region_margin, settings.MOTION_REGION_MARGIN)
+        self.max_skipped_frames = _setting(max_skipped_frames, settings.MOTION_MAX_SKIPPED_FRAMES)
+        self._reference = None
+        self._reference_size = None
+        self._skipped = 0
+
+    def check(self, image_data: bytes) -> GateDecision:
+        """
+        Decide how much of a frame needs recognizing
+
+        Raises:
+            ValueError: if the frame cannot be decoded
+        """
+        thumbnail, full_size = FaceDetector.bytes_to_gray_thumbnail(image_data, self.size)
+
+        if (
+            self._reference is None
+            or full_size != self._reference_size
+            or self._skipped >= self.max_skipped_frames
+        ):
+            return self._accept(thumbnail, full_size, GateDecision(FULL, changed_fraction=1.0))
+
+        changed = self._changed_mask(thumbnail)
+        changed_fraction = float(changed.mean())
+        if changed_fraction < self.min_changed_fraction or not changed.any():
+            self._skipped += 1
+            return GateDecision(STATIC, changed_fraction=changed_fraction)
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        region = self._to_frame_region(rows[0], cols[-1] + 1, rows[-1] + 1, cols[0], full_size)
+        top, right, bottom, left = region
+        region_fraction = (bottom - top) * (right - left) / (full_size[0] * full_size[1])
+        if region_fraction > self.max_region_fraction:
+            decision = GateDecision(FULL, changed_fraction=changed_fraction)
+        else:
+            decision = GateDecision(REGION, region=region, changed_fraction=changed_fraction)
+        return self._accept(thumbnail, full_size, decision)
+
+    def _accept(self, thumbnail: np.ndarray, full_size, decision: GateDecision) -> GateDecision:
+        self._reference = thumbnail
+        self._reference_size = full_size
+        self._skipped = 0
+        return decision
+
+    def _changed_mask(self, thumbnail: np.ndarray) -> np.ndarray:
+        changed = np.abs(thumbnail - self._reference) > self.pixel_threshold
+        # Drop isolated pixels (sensor noise): keep those with two changed neighbours
+        padded = np.pad(changed, 1).astype(np.uint8)
+        height, width = changed.shape
+        neighbours = sum(
+            padded[dy:dy + height, dx:dx + width] for dy in range(3) for dx in range(3)
+        )
+        return changed & (neighbours >= 3)
+
+    def _to_frame_region(self, top: int, right: int, bottom: int, left: int, full_size):
+        """Scale a thumbnail box to the frame and pad it by the margin"""
+        width, height = full_size
+        scale_x = width / self.size[0]
+        scale_y = height / self.size[1]
+        margin_x = self.region_margin * width
+        margin_y = self.region_margin * height
+        return (
+            max(0, int(top * scale_y - margin_y)),
+            min(width, int(np.ceil(right * scale_x + margin_x))),
+            min(height, int(np.ceil(bottom * scale_y + margin_y))),
+            max(0, int(left * scale_x - margin_x))
+        )
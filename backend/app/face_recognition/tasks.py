@@ -0,0 +1,97 @@
+"""
+Recognition work units run on the worker pool
+
+Each task takes the encoded image bytes rather than a decoded array so that
+only the compressed frame crosses the process boundary.
+"""
+import time
+from dataclasses import replace
+import numpy as np
+from .enrollment import EnrollmentPipeline
+from .face_detector import FaceDetector
+from .face_encoder import FaceEncoder
+
+def encode_frame(image_data: bytes, region=None, skip_locations=None):
+    """
+    Decode a frame and generate encodings for all faces in it
+
+    Args:
+        image_data: Encoded frame
+        region: Optional (top, right, bottom, left) box; only faces inside
+            it are searched for, and locations are still returned in
+            full-frame coordinates
+        skip_locations: Optional boxes of already-identified faces, which
+            are located but not encoded (see FaceEncoder.encode_frame)
+
+    Returns:
+        Tuple of (face_locations, encodings, timings) where timings maps
+        stage to milliseconds
+    """
+    return _run_on_region(FaceEncoder.encode_frame, image_data, region, skip_locations)
+
+def detect_frame(image_data: bytes, region=None, skip_locations=None):
+    """
+    Decode a frame, find its faces and cut the aligned chips to encode
+
+    The first half of encode_frame; the chips go through encode_chips,
+    batched with those of other requests. Arguments are as for
+    encode_frame.
+
+    Returns:
+        Tuple of (face_locations, chips, timings); skipped faces have None
+        as chip
+    """
+    return _run_on_region(FaceEncoder.detect_chips, image_data, region, skip_locations)
+
+def encode_chips(chips):
+    """
+    Encode a batch of face chips
+
+    Returns:
+        Tuple of (encodings, encode_ms)
+    """
+    started = time.perf_counter()
+    encodings = FaceEncoder.encode_chips(chips)
+    return encodings, (time.perf_counter() - started) * 1000
+
+def _run_on_region(fn, image_data: bytes, region, skip_locations):
+    """Decode a frame and run fn on it or on a region of it, in full-frame coordinates"""
+    started = time.perf_counter()
+    image = FaceDetector.bytes_to_image(image_data)
+    decode_ms = (time.perf_counter() - started) * 1000
+
+    if region is None:
+        face_locations, results, timings = fn(image, skip_locations=skip_locations)
+    else:
+        top, right, bottom, left = region
+        crop = np.ascontiguousarray(image[top:bottom, left:right])
+        if skip_locations:
+            skip_locations = [
+                (skip_top - top, skip_right - left, skip_bottom - top, skip_left - left)
+                for skip_top, skip_right, skip_bottom, skip_left in skip_locations
+            ]
+        face_locations, results, timings = fn(crop, skip_locations=skip_locations)
+        face_locations = [
+            (face_top + top, face_right + left, face_bottom + top, face_left + left)
+            for face_top, face_right, face_bottom, face_left in face_locations
+        ]
+    timings["decode_ms"] = decode_ms
+    return face_locations, results, timings
+
+def enroll_face(image_data: bytes):
+    """
+    Decode an enrollment photo, check its quality and encode the face in a
+    single detection pass
+
+    Returns:
+        Tuple of (result, thumbnail) where result is an EnrollmentResult
+        without its crop and thumbnail is (bytes, width, height), or None
+        when the photo is rejected
+    """
+    result = EnrollmentPipeline.process_bytes(image_data)
+    if not result.valid:
+        return result, None
+
+    # Only the small thumbnail crosses back to the parent, not the raw crop
+    thumbnail = FaceDetector.image_to_thumbnail(result.crop)
+    return replace(result, crop=None), thumbnail
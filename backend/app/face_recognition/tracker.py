@@ -0,0 +1,137 @@
+"""
+IoU tracking of faces across the frames of one stream
+
+Detections are associated with existing tracks by greedy highest-IoU
+matching. A track whose face matched a student within the confident
+distance is not re-encoded while it stays in view, except every
+TRACK_REVERIFY_FRAMES frames to catch identity switches.
+"""
+import itertools
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional
+from ..config import settings
+
+def iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """Pairwise intersection-over-union of (top, right, bottom, left) boxes"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(bottom - top, 0, None) * np.clip(right - left, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 1] - a[:, 3])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 1] - b[:, 3])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def greedy_assignment(iou: np.ndarray, threshold: float):
+    """
+    Pair rows with columns by descending IoU, each at most once
+
+    Returns:
+        List of (row, column) pairs with IoU >= threshold
+    """
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    pairs, used_rows, used_cols = [], set(), set()
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row not in used_rows and col not in used_cols:
+            pairs.append((row, col))
+            used_rows.add(row)
+            used_cols.add(col)
+    return pairs
+
+@dataclass
+class Track:
+    """One face followed across frames"""
+    track_id: int
+    location: tuple  # (top, right, bottom, left)
+    student_id: Optional[int] = None
+    distance: Optional[float] = None
+    verified_frame: int = -1  # frame of the last encoding
+    misses: int = 0
+
+class FaceTracker:
+    """Per-stream set of face tracks"""
+
+    def __init__(
+        self,
+        iou_threshold: float = None,
+        max_misses: int = None,
+        reverify_frames: int = None,
+        confident_distance: float = None
+    ):
+        self.iou_threshold = settings.TRACK_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        self.max_misses = settings.TRACK_MAX_MISSES if max_misses is None else max_misses
+        self.reverify_frames = settings.TRACK_REVERIFY_FRAMES if reverify_frames is None else reverify_frames
+        self.confident_distance = (
+            settings.TRACK_CONFIDENT_DISTANCE if confident_distance is None else confident_distance
+        )
+        self.tracks: List[Track] = []
+        self.frame = 0
+        self._ids = itertools.count(1)
+
+    def is_confident(self, track: Track) -> bool:
+        """True if the track can skip encoding on the current frame"""
+        return (
+            track.student_id is not None
+            and track.distance is not None
+            and track.distance <= self.confident_distance
+            and self.frame - track.verified_frame < self.reverify_frames
+        )
+
+    def skip_locations(self) -> list:
+        """Boxes of the tracks whose faces need not be encoded this frame"""
+        return [track.location for track in self.tracks if self.is_confident(track)]
+
+    def update(self, face_locations, region=None) -> List[Track]:
+        """
+        Associate this frame's detections with tracks
+
+        Args:
+            face_locations: Detected (top, right, bottom, left) boxes
+            region: Box the detections were limited to; tracks outside it
+                are left as they are
+
+        Returns:
+            The track of every detection, in order; unmatched detections
+            start new tracks
+        """
+        self.frame += 1
+        iou = iou_matrix([track.location for track in self.tracks], face_locations)
+        assigned = [None] * len(face_locations)
+        for track_index, detection_index in greedy_assignment(iou, self.iou_threshold):
+            track = self.tracks[track_index]
+            track.location = tuple(face_locations[detection_index])
+            track.misses = 0
+            assigned[detection_index] = track
+
+        matched = {id(track) for track in assigned if track is not None}
+        for track in self.tracks:
+            if id(track) in matched:
+                continue
+            if region is not None and iou_matrix([track.location], [region])[0, 0] == 0:
+                continue
+            track.misses += 1
+
+        for detection_index, track in enumerate(assigned):
+            if track is None:
+                assigned[detection_index] = Track(next(self._ids), tuple(face_locations[detection_index]))
+                self.tracks.append(assigned[detection_index])
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return assigned
+
+    def verify(self, track: Track, student_id: Optional[int], distance: Optional[float]):
+        """Record the identity an encoding of the track's face produced"""
+        track.student_id = student_id
+        track.distance = distance
+        track.verified_frame = self.frame
@@ -0,0 +1,332 @@
+"""
+Vector indexes for nearest-neighbour search over face encodings
+
+Every index stores (label, vector) pairs with unique integer labels,
+supports incremental add/remove, and persists to a single .npz file.
+BruteForceIndex is exact; IVFIndex partitions vectors around k-means
+centroids and only scans the lists nearest to each query.
+"""
+import os
+import tempfile
+import numpy as np
+from typing import Tuple
+from .face_matcher import FaceMatcher
+
+class VectorIndex:
+    """Growable (label, vector) store shared by the index backends"""
+
+    kind = None
+
+    def __init__(self, dim: int = 128, dtype=np.float32):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._vectors = np.empty((0, dim), dtype=self.dtype)
+        self._labels = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._rows = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._labels[:self._size]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def add(self, labels, vectors):
+        """Insert vectors; a label that is already present is replaced"""
+        labels = np.asarray(labels, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=self.dtype).reshape(-1, self.dim)
+        if len(labels) != len(vectors):
+            raise ValueError("labels and vectors must have the same length")
+        if len(labels) == 0:
+            return
+
+        self.remove(labels)
+        self._reserve(self._size + len(labels))
+
+        start = self._size
+        self._vectors[start:start + len(labels)] = vectors
+        self._labels[start:start + len(labels)] = labels
+        for offset, label in enumerate(labels.tolist()):
+            self._rows[label] = start + offset
+        self._size += len(labels)
+        self._on_add(start, self._size)
+
+    def remove(self, labels):
+        """Delete vectors by label; unknown labels are ignored"""
+        for label in np.asarray(labels, dtype=np.int64).reshape(-1).tolist():
+            row = self._rows.pop(label, None)
+            if row is None:
+                continue
+            self._on_remove(row)
+            # Move the last row into the hole to keep storage contiguous
+            last = self._size - 1
+            if row != last:
+                moved = int(self._labels[last])
+                self._vectors[row] = self._vectors[last]
+                self._labels[row] = moved
+                self._rows[moved] = row
+                self._on_move(last, row)
+            self._size -= 1
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest vectors to each query
+
+        Returns:
+            Tuple of (distances, labels), both (n, k) and sorted by distance;
+            missing neighbours have distance inf and label -1
+        """
+        queries = np.asarray(queries, dtype=self.dtype).reshape(-1, self.dim)
+        distances = np.full((len(queries), k), np.inf)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for i, query in enumerate(queries):
+            rows = self._candidate_rows(query)
+            if len(rows) == 0:
+                continue
+            row_distances = FaceMatcher.distance_matrix(query[None, :], self._vectors[rows])[0]
+            top = min(k, len(rows))
+            nearest = np.argpartition(row_distances, top - 1)[:top]
+            nearest = nearest[np.argsort(row_distances[nearest], kind="stable")]
+            distances[i, :top] = row_distances[nearest]
+            labels[i, :top] = self._labels[rows[nearest]]
+
+        return distances, labels
+
+    def save(self, path: str):
+        """Write the index atomically to path (.npz)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A private temporary file per save, so concurrent savers (one per
+        # worker process) never write into or publish each other's files
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, kind=np.array(self.kind), dim=np.array(self.dim),
+                         labels=self.labels, vectors=self.vectors, **self._state())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._labels):
+            return
+        capacity = max(capacity, 2 * len(self._labels), 64)
+        vectors = np.empty((capacity, self.dim), dtype=self.dtype)
+        labels = np.empty(capacity, dtype=np.int64)
+        vectors[:self._size] = self.vectors
+        labels[:self._size] = self.labels
+        self._vectors, self._labels = vectors, labels
+        self._on_reserve(capacity)
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        return np.arange(self._size)
+
+    # Hooks for backends that keep per-row state
+    def _on_add(self, start: int, stop: int):
+        pass
+
+    def _on_remove(self, row: int):
+        pass
+
+    def _on_move(self, source: int, target: int):
+        pass
+
+    def _on_reserve(self, capacity: int):
+        pass
+
+    def _state(self) -> dict:
+        return {}
+
+class BruteForceIndex(VectorIndex):
+    """Exact search by scanning every vector"""
+
+    kind = "brute"
+
+    def search(self, queries, k: int = 1):
+        queries = np.asarray(queries, dtype=self.dtype).reshape(-1, self.dim)
+        distances = np.full((len(queries), k), np.inf)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if self._size == 0 or len(queries) == 0:
+            return distances, labels
+
+        # Every query scans every row, so score them all in one product
+        all_distances = FaceMatcher.distance_matrix(queries, self.vectors)
+        top = min(k, self._size)
+        nearest = np.argpartition(all_distances, top - 1, axis=1)[:, :top]
+        nearest_distances = np.take_along_axis(all_distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        distances[:, :top] = np.take_along_axis(nearest_distances, order, axis=1)
+        labels[:, :top] = self.labels[nearest]
+        return distances, labels
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: vectors are assigned to the nearest of n_lists
+    k-means centroids and a query scans only its n_probe nearest lists
+
+    Until there are enough vectors to train the centroids every row is
+    scanned; search retrains once the index has grown to four times the
+    size it was trained on.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim: int = 128, dtype=np.float32, n_lists: int = 0, n_probe: int = 8):
+        super().__init__(dim, dtype)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids = None
+        self.trained_size = 0
+        self._assign = np.empty(0, dtype=np.int32)
+        # Rows of each list, and each row's position in its list, so a
+        # probe touches only the rows of the probed lists
+        self._lists = None
+        self._list_pos = np.empty(0, dtype=np.int64)
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """Run k-means over the current vectors and reassign every row"""
+        vectors = self.vectors
+        n_lists = self.n_lists or int(np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].astype(np.float64)
+        for _ in range(iterations):
+            assign = self._nearest_centroid(vectors, centroids)
+            counts = np.bincount(assign, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self.centroids = centroids.astype(self.dtype)
+        self.trained_size = len(vectors)
+        self._assign[:self._size] = self._nearest_centroid(vectors, self.centroids)
+        self._build_lists()
+
+    def _build_lists(self):
+        """Regroup every row by its assigned list"""
+        assign = self._assign[:self._size]
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self.centroids))]
+        self._list_pos[order] = np.arange(self._size) - bounds[assign[order]]
+
+    def search(self, queries, k: int = 1):
+        if self._needs_training():
+            self.train()
+        return super().search(queries, k)
+
+    def _needs_training(self) -> bool:
+        if self._size < 2 * max(self.n_lists, 16):
+            return False
+        return self.centroids is None or self._size > 4 * self.trained_size
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(self._size)
+        centroid_distances = FaceMatcher.distance_matrix(query[None, :], self.centroids)[0]
+        probe = min(self.n_probe, len(self.centroids))
+        lists = np.argpartition(centroid_distances, probe - 1)[:probe]
+        return np.sort(np.fromiter(
+            (row for i in lists.tolist() for row in self._lists[i]), dtype=np.int64
+        ))
+
+    @staticmethod
+    def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 4096):
+            chunk = vectors[start:start + 4096]
+            assign[start:start + len(chunk)] = FaceMatcher.distance_matrix(chunk, centroids).argmin(axis=1)
+        return assign
+
+    def _on_add(self, start: int, stop: int):
+        if self.centroids is not None:
+            self._assign[start:stop] = self._nearest_centroid(self._vectors[start:stop], self.centroids)
+        if self._lists is not None:
+            for row in range(start, stop):
+                rows = self._lists[self._assign[row]]
+                self._list_pos[row] = len(rows)
+                rows.append(row)
+
+    def _on_remove(self, row: int):
+        if self._lists is None:
+            return
+        rows = self._lists[self._assign[row]]
+        last = rows.pop()
+        if last != row:
+            position = self._list_pos[row]
+            rows[position] = last
+            self._list_pos[last] = position
+
+    def _on_move(self, source: int, target: int):
+        self._assign[target] = self._assign[source]
+        if self._lists is not None:
+            position = self._list_pos[source]
+            self._lists[self._assign[source]][position] = target
+            self._list_pos[target] = position
+
+    def _on_reserve(self, capacity: int):
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[:self._size] = self._assign[:self._size]
+        self._assign = assign
+        list_pos = np.zeros(capacity, dtype=np.int64)
+        list_pos[:self._size] = self._list_pos[:self._size]
+        self._list_pos = list_pos
+
+    def _state(self) -> dict:
+        if self.centroids is None:
+            return {"n_lists": np.array(self.n_lists), "n_probe": np.array(self.n_probe)}
+        return {
+            "n_lists": np.array(self.n_lists),
+            "n_probe": np.array(self.n_probe),
+            "centroids": self.centroids,
+            "assign": self._assign[:self._size],
+            "trained_size": np.array(self.trained_size)
+        }
+
+INDEX_BACKENDS = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex
+}
+
+def create_index(kind: str = "brute", dim: int = 128, **options) -> VectorIndex:
+    """Build an empty index of the named backend"""
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend: {kind}")
+    return INDEX_BACKENDS[kind](dim=dim, **options)
+
+def load_index(path: str) -> VectorIndex:
+    """Read an index written by VectorIndex.save"""
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        dim = int(data["dim"])
+        vectors = data["vectors"]
+        options = {}
+        if kind == IVFIndex.kind:
+            options = {"n_lists": int(data["n_lists"]), "n_probe": int(data["n_probe"])}
+        index = create_index(kind, dim, dtype=vectors.dtype, **options)
+
+        if kind == IVFIndex.kind and "centroids" in data:
+            index.centroids = data["centroids"]
+            index.trained_size = int(data["trained_size"])
+            index._reserve(len(vectors))
+            index._assign[:len(vectors)] = data["assign"]
+            # Rows keep their saved assignment; skip reassigning on add
+            centroids, index.centroids = index.centroids, None
+            index.add(data["labels"], vectors)
+            index.centroids = centroids
+            index._build_lists()
+        else:
+            index.add(data["labels"], vectors)
+
+    return index
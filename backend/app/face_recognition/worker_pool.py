@@ -0,0 +1,186 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from .. import metrics
+from ..config import settings
+
+class RecognitionPoolBusy(Exception):
+    """Raised when the recognition admission queue is full"""
+
+def _init_worker():
+    """Load the dlib models once per worker process"""
+    import face_recognition
+
+    # The first call initializes the detector; do it before real work arrives
+    face_recognition.face_locations(np.zeros((64, 64, 3), dtype=np.uint8))
+
+class RecognitionPool:
+    """
+    Runs CPU-bound detection/encoding on a pool of worker processes
+
+    At most `workers` tasks run at once and at most `queue_size` more wait
+    for a slot; anything beyond that is rejected with RecognitionPoolBusy so
+    callers can answer with backpressure instead of piling up threads. With
+    zero workers, tasks run inline in the calling thread under the same
+    admission limits.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None, queue_timeout: float = None):
+        self.workers = settings.RECOGNITION_WORKERS if workers is None else workers
+        self.queue_size = settings.RECOGNITION_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = settings.RECOGNITION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self._slots = threading.Semaphore(max(1, self.workers))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker
+                    )
+        return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args):
+        """
+        Run fn(*args) on a worker, blocking until it finishes
+
+        Raises:
+            RecognitionPoolBusy: if the queue is full or no slot frees up
+                within the queue timeout
+        """
+        with self._lock:
+            if self._waiting >= self.queue_size and self._running >= max(1, self.workers):
+                self._rejected += 1
+                raise RecognitionPoolBusy("Recognition queue is full")
+            self._waiting += 1
+
+        enqueued_at = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        wait = time.monotonic() - enqueued_at
+        metrics.QUEUE_WAIT_SECONDS.observe(wait)
+
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._rejected += 1
+                raise RecognitionPoolBusy("Timed out waiting for a recognition worker")
+            self._running += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return fn(*args)
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for the next task
+            self._reset_executor(executor)
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            self._slots.release()
+
+    def map(self, fn, items):
+        """
+        Run fn(item) for every item across the workers
+        
+        Batch jobs wait for free slots rather than being rejected, and never
+        hold more than `workers` slots, so interactive requests keep getting
+        served in between. A failing item does not stop the batch.
+        
+        Returns:
+            List of (result, error) tuples in input order, where exactly one
+            of the two is None
+        """
+        executor = self._get_executor()
+        if executor is None:
+            return [self._run_inline(fn, item) for item in items]
+        
+        futures = []
+        for item in items:
+            enqueued_at = time.monotonic()
+            self._slots.acquire()
+            metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at)
+            with self._lock:
+                self._running += 1
+            try:
+                future = executor.submit(fn, item)
+            except Exception:
+                self._release_slot()
+                raise
+            future.add_done_callback(lambda _: self._release_slot())
+            futures.append(future)
+        
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append((future.result(), None))
+            except BrokenProcessPool as e:
+                self._reset_executor(executor)
+                outcomes.append((None, e))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+    
+    def _run_inline(self, fn, item):
+        self._slots.acquire()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(item), None
+        except Exception as e:
+            return None, e
+        finally:
+            self._release_slot()
+    
+    def _release_slot(self):
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+        self._slots.release()
+    
+    def stats(self) -> dict:
+        """Queue depth, in-flight tasks and wait times"""
+        with self._lock:
+            admitted = self._completed + self._running
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": self._waiting,
+                "in_flight": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(1000 * self._wait_total / admitted, 2) if admitted else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 2)
+            }
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+recognition_pool = RecognitionPool()
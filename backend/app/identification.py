@@ -0,0 +1,252 @@
+"""Institution-wide face identification over every enrolled sample"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .face_recognition import FaceEncoder
+from .face_recognition.vector_index import create_index, load_index
+
+logger = logging.getLogger(__name__)
+
+
+class IdentificationIndex:
+    """
+    Vector index over every face sample in the database, labelled by
+    FaceEmbedding.id
+
+    The index is loaded from disk on first use and rebuilt only when the
+    saved copy no longer matches the face_embeddings table. Student writes
+    must call sync_students() so the index follows adds and removals without
+    a rebuild; changes are written back every `save_every` updates and on
+    shutdown. Writes made by other worker processes are picked up by
+    comparing sample ids with the table every `refresh_seconds`.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        backend: str = None,
+        save_every: int = None,
+        refresh_seconds: float = None
+    ):
+        self.path = path or settings.VECTOR_INDEX_PATH
+        self.backend = backend or settings.VECTOR_INDEX_BACKEND
+        self.save_every = save_every or settings.VECTOR_INDEX_SAVE_EVERY
+        self.refresh_seconds = settings.VECTOR_INDEX_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._index = None
+        self._checked_at = 0.0
+        self._owners: Dict[int, int] = {}
+        self._samples_by_student: Dict[int, set] = {}
+        self._pending_changes = 0
+        self._lock = threading.RLock()
+
+    def ensure_loaded(self, db: Session):
+        """Load the saved index, rebuilding it if it is missing or stale"""
+        with self._lock:
+            if self._index is not None:
+                if self.refresh_seconds and time.monotonic() - self._checked_at > self.refresh_seconds:
+                    self._refresh(db)
+                return
+
+            owners = db.query(models.FaceEmbedding.id, models.FaceEmbedding.student_id).all()
+            index = self._load_saved(owners)
+            if index is None:
+                index = self._build(db)
+                self._save(index)
+
+            self._index = index
+            self._owners = {}
+            self._samples_by_student = {}
+            for sample_id, student_id in owners:
+                self._track(sample_id, student_id)
+            self._checked_at = time.monotonic()
+
+    def sync_students(self, db: Session, student_ids: Iterable[int]):
+        """
+        Replace the indexed samples of these students with the committed ones
+
+        Deleted students simply end up with no samples. A no-op until the
+        index has been loaded, since loading reads the current rows anyway.
+        """
+        student_ids = list(student_ids)
+        if self._index is None or not student_ids:
+            return
+
+        rows = db.query(
+            models.FaceEmbedding.id, models.FaceEmbedding.student_id, models.FaceEmbedding.embedding
+        ).filter(models.FaceEmbedding.student_id.in_(student_ids)).all()
+        self._replace(student_ids, rows)
+
+    def remove_students(self, student_ids: Iterable[int]):
+        """Drop the indexed samples of deleted students; needs no database session"""
+        student_ids = list(student_ids)
+        if self._index is None or not student_ids:
+            return
+        self._replace(student_ids, [])
+
+    def search(self, encodings, k: int = None, tolerance: float = None) -> List[List[Tuple[int, float]]]:
+        """
+        Nearest students for each encoding
+
+        Returns:
+            One list per encoding of (student_id, distance) within tolerance,
+            closest first, with each student listed once
+        """
+        k = k or settings.IDENTIFY_TOP_K
+        if tolerance is None:
+            tolerance = settings.FACE_MATCH_TOLERANCE
+        if len(encodings) == 0:
+            return []
+
+        with self._lock:
+            # Several samples of one student can fill the top k; over-fetch
+            distances, labels = self._index.search(encodings, k * settings.FACE_SAMPLES_PER_STUDENT)
+            owners = self._owners
+
+            results = []
+            for row_distances, row_labels in zip(distances, labels):
+                seen = set()
+                candidates = []
+                for distance, label in zip(row_distances.tolist(), row_labels.tolist()):
+                    if label < 0 or distance > tolerance:
+                        break
+                    student_id = owners.get(label)
+                    if student_id is None or student_id in seen:
+                        continue
+                    seen.add(student_id)
+                    candidates.append((student_id, distance))
+                    if len(candidates) == k:
+                        break
+                results.append(candidates)
+        return results
+
+    def save(self):
+        """Write pending changes to disk"""
+        with self._lock:
+            if self._index is not None and self._pending_changes:
+                self._save(self._index)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "loaded": self._index is not None,
+                "vectors": len(self._index) if self._index is not None else 0,
+                "pending_changes": self._pending_changes
+            }
+
+    def _refresh(self, db: Session):
+        """Apply samples added or removed by other processes since the last check"""
+        current = dict(db.query(models.FaceEmbedding.id, models.FaceEmbedding.student_id).all())
+        removed = [sample_id for sample_id in self._owners if sample_id not in current]
+        added = [sample_id for sample_id in current if sample_id not in self._owners]
+
+        for sample_id in removed:
+            student_id = self._owners.pop(sample_id)
+            samples = self._samples_by_student.get(student_id)
+            if samples is not None:
+                samples.discard(sample_id)
+                if not samples:
+                    del self._samples_by_student[student_id]
+        self._index.remove(removed)
+
+        for start in range(0, len(added), 5000):
+            rows = db.query(models.FaceEmbedding.id, models.FaceEmbedding.embedding).filter(
+                models.FaceEmbedding.id.in_(added[start:start + 5000])
+            ).all()
+            if rows:
+                self._index.add(
+                    [sample_id for sample_id, _ in rows],
+                    np.vstack([FaceEncoder.bytes_to_encoding(embedding) for _, embedding in rows])
+                )
+                for sample_id, _ in rows:
+                    self._track(sample_id, current[sample_id])
+
+        if removed or added:
+            self._pending_changes += 1
+        self._checked_at = time.monotonic()
+
+    def _track(self, sample_id: int, student_id: int):
+        self._owners[sample_id] = student_id
+        self._samples_by_student.setdefault(student_id, set()).add(sample_id)
+
+    def _load_saved(self, owners):
+        """The saved index if it holds exactly the current sample ids, else None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            index = load_index(self.path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable face index at {self.path}: {str(e)}")
+            return None
+
+        if index.kind != self.backend:
+            return None
+        saved_ids = np.sort(index.labels)
+        current_ids = np.sort(np.array([sample_id for sample_id, _ in owners], dtype=np.int64))
+        if not np.array_equal(saved_ids, current_ids):
+            logger.info("Saved face index is stale; rebuilding")
+            return None
+        return index
+
+    def _build(self, db: Session):
+        options = {}
+        if self.backend == "ivf":
+            options = {"n_lists": settings.VECTOR_INDEX_IVF_LISTS, "n_probe": settings.VECTOR_INDEX_IVF_PROBES}
+        index = create_index(self.backend, **options)
+
+        last_id = 0
+        while True:
+            rows = db.query(models.FaceEmbedding.id, models.FaceEmbedding.embedding).filter(
+                models.FaceEmbedding.id > last_id
+            ).order_by(models.FaceEmbedding.id).limit(5000).all()
+            if not rows:
+                break
+            index.add(
+                [sample_id for sample_id, _ in rows],
+                np.vstack([FaceEncoder.bytes_to_encoding(embedding) for _, embedding in rows])
+            )
+            last_id = rows[-1][0]
+
+        if self.backend == "ivf" and len(index):
+            index.train()
+        logger.info(f"Built {self.backend} face index with {len(index)} samples")
+        return index
+
+    def _replace(self, student_ids: list, rows: list):
+        with self._lock:
+            stale = []
+            for student_id in student_ids:
+                stale.extend(self._samples_by_student.pop(student_id, ()))
+            for sample_id in stale:
+                self._owners.pop(sample_id, None)
+            self._index.remove(stale)
+
+            if rows:
+                self._index.add(
+                    [sample_id for sample_id, _, _ in rows],
+                    np.vstack([FaceEncoder.bytes_to_encoding(embedding) for _, _, embedding in rows])
+                )
+                for sample_id, student_id, _ in rows:
+                    self._track(sample_id, student_id)
+
+            self._pending_changes += 1
+            if self._pending_changes >= self.save_every:
+                self._save(self._index)
+
+    def _save(self, index):
+        try:
+            index.save(self.path)
+            self._pending_changes = 0
+        except OSError as e:
+            logger.warning(f"Could not save face index to {self.path}: {str(e)}")
+
+
+identification_index = IdentificationIndex()
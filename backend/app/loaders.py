@@ -0,0 +1,52 @@
+"""
+Explicit loaders for deferred binary columns
+
+Teacher.photo, Student.photo, Student.face_embedding and Student.face_samples
+are deferred on the models so that auth and listing queries never fetch them.
+Paths that need the bytes go through these loaders, which select only the
+columns they use.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def load_class_embeddings(db: Session, class_id: int) -> List[Tuple[int, bytes, Optional[bytes]]]:
+    """
+    (student_id, face_embedding, face_samples) for every enrolled student of
+    a class, by id; one query covers the centroids and all packed samples
+    """
+    return db.query(
+        models.Student.id,
+        models.Student.face_embedding,
+        models.Student.face_samples
+    ).filter(
+        models.Student.class_id == class_id,
+        models.Student.face_embedding.isnot(None)
+    ).order_by(models.Student.id).all()
+
+
+def load_student_samples(db: Session, student_id: int) -> List[bytes]:
+    """Every stored embedding sample of a student, oldest first"""
+    return [
+        embedding for (embedding,) in db.query(models.FaceEmbedding.embedding).filter(
+            models.FaceEmbedding.student_id == student_id
+        ).order_by(models.FaceEmbedding.id)
+    ]
+
+
+def load_student_photo(db: Session, student_id: int) -> Tuple[Optional[bytes], Optional[str]]:
+    """(photo, photo_etag) of a student, or (None, None) if it does not exist"""
+    row = db.query(models.Student.photo, models.Student.photo_etag).filter(
+        models.Student.id == student_id
+    ).first()
+    return tuple(row) if row else (None, None)
+
+
+def load_teacher_photo(db: Session, teacher_id: int) -> Optional[bytes]:
+    """Photo bytes of a teacher, or None"""
+    return db.query(models.Teacher.photo).filter(
+        models.Teacher.id == teacher_id
+    ).scalar()
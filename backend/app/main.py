@@ -1,9 +1,18 @@
-from fastapi import FastAPI
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
+from .metrics import Gauge, registry
 from .database import init_db
 from .middleware import log_requests, error_handler
 from .api import auth, teachers, classes, students, attendance
+from .face_recognition import RecognitionPoolBusy, recognition_pool
+from .face_recognition.batching import encoding_batcher
+from .face_recognition.frame_cache import frame_cache
+from .embedding_store import embedding_store
+from .identification import identification_index
+from .token_cache import token_cache
 
 app = FastAPI(
     title="Face Recognition Attendance System",
@@ -18,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Before"],  # keyset pagination cursor of the attendance history
 )
 
 # Custom middleware
@@ -31,11 +41,53 @@ app.include_router(classes.router)
 app.include_router(students.router)
 app.include_router(attendance.router)
 
+# Point-in-time values read at scrape time
+registry.register(Gauge(
+    "recognition_queue_depth", "Recognition tasks waiting for a worker slot",
+    lambda: recognition_pool.stats()["queue_depth"]
+))
+registry.register(Gauge(
+    "recognition_in_flight", "Recognition tasks running on a worker",
+    lambda: recognition_pool.stats()["in_flight"]
+))
+registry.register(Gauge(
+    "encode_batch_avg_size", "Average face chips per batched encoder call since start",
+    lambda: encoding_batcher.stats()["avg_batch_size"]
+))
+registry.register(Gauge(
+    "recognition_rejected", "Recognition tasks rejected by admission control since start",
+    lambda: recognition_pool.stats()["rejected"]
+))
+
+@app.exception_handler(RecognitionPoolBusy)
+def recognition_busy_handler(request: Request, exc: RecognitionPoolBusy):
+    """Reject recognition requests with backpressure when the queue is full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Recognition service is busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(BrokenProcessPool)
+def recognition_worker_failed_handler(request: Request, exc: BrokenProcessPool):
+    """A recognition worker died (e.g. out of memory); the pool restarts on the next task"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Recognition worker failed, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
 @app.on_event("startup")
 def startup_event():
     """Initialize database on startup"""
     init_db()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop the recognition worker processes and save the face index"""
+    recognition_pool.shutdown()
+    identification_index.save()
+
 @app.get("/")
 def read_root():
     return {
@@ -46,4 +98,17 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "recognition": recognition_pool.stats(),
+        "frame_cache": frame_cache.stats(),
+        "encode_batching": encoding_batcher.stats(),
+        "token_cache": token_cache.stats(),
+        "identification_index": identification_index.stats(),
+        "embedding_store": embedding_store.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Stage latency histograms and recognition counters in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
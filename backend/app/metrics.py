@@ -0,0 +1,230 @@
+"""
+In-process metrics exposed in the Prometheus text format on /metrics
+
+Hot-path code records into the module-level metrics below. Each worker
+process keeps its own registry, so scrape every worker (or run one per
+pod) when using several.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+# Seconds; spans sub-millisecond matching up to multi-second HOG passes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self):
+        return iter(())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(key)} {count}"
+
+
+class Gauge(Metric):
+    """Value read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self):
+        yield f"{self.name} {_format_value(self.callback())}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "recognition_stage_duration_seconds",
+    "Time spent per recognition stage (b64_decode, motion_gate, frame_hash, image_decode, detection, batch_wait, encoding, matching, db_read, db_write)",
+    ("operation", "stage")
+))
+QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    "recognition_queue_wait_seconds", "Time a recognition task waited for a worker slot"
+))
+DB_POOL_CHECKOUT_SECONDS = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the database pool"
+))
+FACES_DETECTED_PER_FRAME = registry.register(Histogram(
+    "recognition_faces_detected_per_frame", "Faces detected in each recognized frame",
+    ("operation",), buckets=COUNT_BUCKETS
+))
+FACES_DETECTED = registry.register(Counter(
+    "recognition_faces_detected_total", "Faces detected across all frames", ("operation",)
+))
+FACES_MATCHED = registry.register(Counter(
+    "recognition_faces_matched_total", "Detected faces matched to an enrolled student", ("operation",)
+))
+FRAMES = registry.register(Counter(
+    "recognition_frames_total", "Frames run through recognition", ("operation",)
+))
+ENCODE_BATCH_SIZE = registry.register(Histogram(
+    "encode_batch_size", "Face chips per batched encoder call", buckets=BATCH_BUCKETS
+))
+ENCODE_BATCH_WAIT_SECONDS = registry.register(Histogram(
+    "encode_batch_wait_seconds", "Time an encoding batch stayed open for other requests"
+))
+LIVE_FRAMES = registry.register(Counter(
+    "live_frames_total", "Streamed frames by motion gate decision (static, region, full)", ("mode",)
+))
+LIVE_FACES = registry.register(Counter(
+    "live_faces_total", "Faces in streamed frames, encoded or identified by their track", ("result",)
+))
+FRAME_CACHE_LOOKUPS = registry.register(Counter(
+    "frame_cache_lookups_total", "Frame cache lookups by result (hit, miss)", ("result",)
+))
+TOKEN_CACHE_LOOKUPS = registry.register(Counter(
+    "token_cache_lookups_total", "Access token cache lookups by result (hit, miss)", ("result",)
+))
+
+# Worker-side timings (milliseconds) -> stage label
+TIMING_STAGES = {
+    "gate_ms": "motion_gate",
+    "hash_ms": "frame_hash",
+    "decode_ms": "image_decode",
+    "resize_ms": "detection",
+    "detect_ms": "detection",
+    "refine_ms": "detection",
+    "chip_ms": "encoding",
+    "batch_wait_ms": "batch_wait",
+    "encode_ms": "encoding",
+    "match_ms": "matching",
+}
+
+
+def observe_timings(operation: str, timings: Dict[str, float]):
+    """Record a stage -> milliseconds dict, summing keys that share a stage"""
+    stages = {}
+    for key, ms in timings.items():
+        stage = TIMING_STAGES.get(key)
+        if stage is not None:
+            stages[stage] = stages.get(stage, 0.0) + ms
+    for stage, ms in stages.items():
+        STAGE_SECONDS.observe(ms / 1000, operation=operation, stage=stage)
+
+
+def observe_frame(operation: str, faces_detected: int, faces_matched: int):
+    FRAMES.inc(operation=operation)
+    FACES_DETECTED.inc(faces_detected, operation=operation)
+    FACES_MATCHED.inc(faces_matched, operation=operation)
+    FACES_DETECTED_PER_FRAME.observe(faces_detected, operation=operation)
@@ -2,19 +2,29 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 import time
 import logging
+from .metrics import HTTP_REQUEST_SECONDS
 
 logger = logging.getLogger(__name__)
 
 async def log_requests(request: Request, call_next):
     """Log all incoming requests"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     response = await call_next(request)
     
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     logger.info(
         f"{request.method} {request.url.path} "
-        f"completed in {process_time:.2f}s with status {response.status_code}"
+        f"completed in {process_time * 1000:.1f}ms with status {response.status_code}"
+    )
+    
+    # Label by route template so /students/1 and /students/2 share a series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        process_time,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
     )
     
     return response
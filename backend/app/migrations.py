@@ -0,0 +1,261 @@
+"""
+In-place schema and data migrations
+
+Run automatically by init_db() after create_all(), or by hand with
+`python -m app.migrations`. Every step is idempotent.
+"""
+import logging
+import math
+
+import numpy as np
+from sqlalchemy import Integer, LargeBinary, String, func, inspect, text
+from sqlalchemy.orm import Session, undefer
+
+from . import models
+from .config import settings
+from .database import Base
+from .face_recognition import FaceDetector, embedding_format
+from .security import photo_etag
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+# Columns added after the first release: table -> [(column, SQLAlchemy type)]
+ADDED_COLUMNS = {
+    "students": [
+        ("photo_width", Integer()),
+        ("photo_height", Integer()),
+        ("photo_etag", String()),
+        ("face_samples", LargeBinary()),
+    ],
+}
+
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG", b"RIFF", b"GIF8", b"BM")
+
+
+def add_missing_columns(engine):
+    """Add columns that create_all() does not add to existing tables"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, column_type in columns:
+                if name not in existing:
+                    logger.info(f"Adding column {table}.{name}")
+                    ddl_type = column_type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+
+def create_indexes(engine):
+    """Create model indexes missing from existing tables"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def create_search_indexes(engine):
+    """
+    Trigram indexes so class search (ILIKE '%q%') can avoid a table scan
+
+    PostgreSQL only; skipped with a warning if pg_trgm cannot be enabled.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for column in ("name", "subject"):
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_classes_{column}_trgm "
+                    f"ON classes USING gin ({column} gin_trgm_ops)"
+                ))
+    except Exception as e:
+        logger.warning(f"Skipping trigram search indexes: {str(e)}")
+
+
+def _raw_photo_to_image(photo: bytes):
+    """
+    Recover an RGB array from a legacy photo blob
+
+    Early versions stored face_image.tobytes() without its shape. HOG face
+    boxes are square, so a blob of 3 * n * n bytes is an n x n crop; any
+    other length cannot be recovered.
+    """
+    if photo.startswith(IMAGE_SIGNATURES):
+        return FaceDetector.bytes_to_image(photo)
+
+    if len(photo) % 3:
+        return None
+    side = math.isqrt(len(photo) // 3)
+    if side * side * 3 != len(photo):
+        return None
+    return np.frombuffer(photo, dtype=np.uint8).reshape(side, side, 3)
+
+
+def convert_student_photos(engine) -> int:
+    """Replace raw pixel blobs with thumbnails; returns rows converted"""
+    converted = 0
+    last_id = 0
+
+    with Session(engine) as db:
+        while True:
+            students = db.query(models.Student).options(
+                undefer(models.Student.photo)
+            ).filter(
+                models.Student.id > last_id,
+                models.Student.photo.isnot(None),
+                models.Student.photo_etag.is_(None)
+            ).order_by(models.Student.id).limit(BATCH_SIZE).all()
+
+            if not students:
+                break
+
+            for student in students:
+                last_id = student.id
+                try:
+                    image = _raw_photo_to_image(student.photo)
+                except ValueError:
+                    image = None
+
+                if image is None:
+                    logger.warning(f"Dropping unrecoverable photo of student {student.id}")
+                    student.photo = None
+                    continue
+
+                photo, width, height = FaceDetector.image_to_thumbnail(image)
+                student.photo = photo
+                student.photo_width = width
+                student.photo_height = height
+                student.photo_etag = photo_etag(photo)
+                converted += 1
+
+            db.commit()
+            db.expunge_all()
+
+    if converted:
+        logger.info(f"Converted {converted} student photos to thumbnails")
+    return converted
+
+
+def backfill_face_samples(engine) -> int:
+    """
+    Give every student enrolled with a single embedding its first sample row
+    and packed sample set; returns students backfilled
+    """
+    backfilled = 0
+    last_id = 0
+
+    with Session(engine) as db:
+        while True:
+            rows = db.query(
+                models.Student.id, models.Student.class_id, models.Student.face_embedding
+            ).filter(
+                models.Student.id > last_id,
+                models.Student.face_embedding.isnot(None),
+                models.Student.face_samples.is_(None)
+            ).order_by(models.Student.id).limit(BATCH_SIZE).all()
+
+            if not rows:
+                break
+
+            for student_id, class_id, embedding in rows:
+                last_id = student_id
+                db.add(models.FaceEmbedding(
+                    student_id=student_id, class_id=class_id, embedding=embedding
+                ))
+                db.query(models.Student).filter(models.Student.id == student_id).update(
+                    {models.Student.face_samples: embedding}, synchronize_session=False
+                )
+                backfilled += 1
+
+            db.commit()
+
+    if backfilled:
+        logger.info(f"Backfilled face samples for {backfilled} students")
+    return backfilled
+
+
+# Blob columns holding encodings: (model, column name)
+EMBEDDING_COLUMNS = (
+    (models.Student, "face_embedding"),
+    (models.Student, "face_samples"),
+    (models.FaceEmbedding, "embedding"),
+)
+
+
+def convert_embedding_format(engine) -> int:
+    """
+    Rewrite headerless float64 encodings in the configured format; returns
+    blobs converted
+
+    A blob whose converted form moves any encoding by more than
+    EMBEDDING_MAX_ERROR is kept at full precision (with a header) instead.
+    """
+    target = settings.EMBEDDING_DTYPE
+    legacy_size = 8 * 128
+    converted = 0
+    kept_precise = 0
+    worst_error = 0.0
+
+    with Session(engine) as db:
+        for model, name in EMBEDDING_COLUMNS:
+            column = getattr(model, name)
+            last_id = 0
+            while True:
+                # Legacy blobs are whole float64 rows; headered blobs never are
+                rows = db.query(model.id, column).filter(
+                    model.id > last_id,
+                    column.isnot(None),
+                    func.length(column) % legacy_size == 0
+                ).order_by(model.id).limit(BATCH_SIZE).all()
+
+                if not rows:
+                    break
+
+                updates = []
+                for row_id, data in rows:
+                    last_id = row_id
+                    if embedding_format.describe(data)[0] is not None:
+                        continue
+                    encodings = embedding_format.unpack(data)
+                    packed = embedding_format.pack(encodings, target)
+                    error = embedding_format.max_error(encodings, packed)
+                    if error > settings.EMBEDDING_MAX_ERROR:
+                        packed = embedding_format.pack(encodings, "float64")
+                        kept_precise += 1
+                    else:
+                        worst_error = max(worst_error, error)
+                    updates.append({"id": row_id, name: packed})
+
+                if updates:
+                    db.bulk_update_mappings(model, updates)
+                    db.commit()
+                    converted += len(updates)
+
+    if converted:
+        logger.info(
+            f"Converted {converted} embeddings to {target} "
+            f"(max distance error {worst_error:.2e}, {kept_precise} kept as float64)"
+        )
+    return converted
+
+
+def run_migrations(engine):
+    """Apply every migration step in order"""
+    add_missing_columns(engine)
+    create_indexes(engine)
+    create_search_indexes(engine)
+    convert_student_photos(engine)
+    backfill_face_samples(engine)
+    convert_embedding_format(engine)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    run_migrations(engine)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Date, UniqueConstraint, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Date, UniqueConstraint, Boolean, Index
+from sqlalchemy.orm import column_property, deferred, relationship
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -10,7 +10,7 @@ class Teacher(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     name = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
-    photo = Column(LargeBinary, nullable=True)
+    photo = deferred(Column(LargeBinary, nullable=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     classes = relationship("Class", back_populates="teacher", cascade="all, delete-orphan")
@@ -21,7 +21,7 @@ class Class(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     subject = Column(String, nullable=True)
-    teacher_id = Column(Integer, ForeignKey("teachers.id", ondelete="CASCADE"), nullable=False)
+    teacher_id = Column(Integer, ForeignKey("teachers.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     teacher = relationship("Teacher", back_populates="classes")
@@ -34,18 +34,40 @@ class Student(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     roll_number = Column(String, nullable=True)
-    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False)
-    face_embedding = Column(LargeBinary, nullable=True)
-    photo = Column(LargeBinary, nullable=True)
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Binary columns are deferred; load them through app.loaders
+    # face_embedding is the centroid of the samples in face_embeddings, and
+    # face_samples packs those samples into one (n, d) array
+    face_embedding = deferred(Column(LargeBinary, nullable=True))
+    face_samples = deferred(Column(LargeBinary, nullable=True))
+    photo = deferred(Column(LargeBinary, nullable=True))
+    photo_width = Column(Integer, nullable=True)
+    photo_height = Column(Integer, nullable=True)
+    photo_etag = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     class_obj = relationship("Class", back_populates="students")
     attendances = relationship("Attendance", back_populates="student", cascade="all, delete-orphan")
+    embeddings = relationship("FaceEmbedding", back_populates="student", cascade="all, delete-orphan")
     
     __table_args__ = (
         UniqueConstraint('roll_number', 'class_id', name='unique_roll_per_class'),
     )
 
+# Computed in SQL so listings can report it without loading the embedding
+Student.has_face_data = column_property(Student.__table__.c.face_embedding.isnot(None))
+
+class FaceEmbedding(Base):
+    __tablename__ = "face_embeddings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True)
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False, index=True)
+    embedding = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    student = relationship("Student", back_populates="embeddings")
+
 class Attendance(Base):
     __tablename__ = "attendances"
     
@@ -61,4 +83,5 @@ class Attendance(Base):
     
     __table_args__ = (
         UniqueConstraint('student_id', 'date', name='unique_attendance_per_day'),
+        Index('ix_attendance_class_date', 'class_id', 'date'),
     )
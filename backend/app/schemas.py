@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import date, datetime
 
 # Teacher Schemas
@@ -42,6 +42,8 @@ class ClassResponse(BaseModel):
     teacher_id: int
     created_at: datetime
     student_count: Optional[int] = 0
+    face_enrolled_count: Optional[int] = 0
+    last_attendance_date: Optional[date] = None
     
     class Config:
         from_attributes = True
@@ -62,13 +64,53 @@ class StudentResponse(BaseModel):
     name: str
     roll_number: Optional[str]
     class_id: int
-    photo: Optional[str] = None
+    photo: Optional[str] = None  # deprecated, always None; use photo_url
+    photo_url: Optional[str] = None
     has_face_data: bool = False
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class FaceSampleCreate(BaseModel):
+    photo_base64: str
+
+class FaceSamplesResponse(BaseModel):
+    student_id: int
+    sample_count: int
+
+class BulkEnrollmentItem(BaseModel):
+    index: int  # position in the submitted batch
+    name: Optional[str] = None
+    roll_number: Optional[str] = None
+    success: bool
+    student: Optional[StudentResponse] = None
+    error: Optional[str] = None
+
+class BulkEnrollmentResponse(BaseModel):
+    created_count: int
+    failed_count: int
+    items: List[BulkEnrollmentItem]
+
+class IdentifyRequest(BaseModel):
+    frame_base64: str
+
+class IdentifyCandidate(BaseModel):
+    student_id: int
+    name: str
+    roll_number: Optional[str]
+    class_id: int
+    class_name: str
+    distance: float
+
+class IdentifiedFace(BaseModel):
+    face_index: int
+    candidates: List[IdentifyCandidate]  # closest first; empty if unknown
+
+class IdentifyResponse(BaseModel):
+    faces_detected: int
+    faces: List[IdentifiedFace]
+
 # Attendance Schemas
 class AttendanceMarkRequest(BaseModel):
     frame_base64: str
@@ -80,6 +122,8 @@ class AttendanceMarkResponse(BaseModel):
     absent_count: int
     present_students: List[StudentResponse]
     absent_students: List[StudentResponse]
+    write_ms: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None  # recognition stage -> milliseconds
 
 class AttendanceResponse(BaseModel):
     id: int
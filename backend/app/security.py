@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta
+import hashlib
+import hmac
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -50,3 +52,27 @@ def decode_access_token(token: str):
         return payload
     except JWTError:
         return None
+
+
+def photo_etag(photo: bytes) -> str:
+    """Content hash used as the ETag and cache-busting version of a photo"""
+    return hashlib.sha256(photo).hexdigest()[:16]
+
+
+def sign_photo(student_id: int, etag: str) -> str:
+    """Sign a student photo version so it can be fetched without a bearer token"""
+    message = f"{student_id}:{etag}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_photo_signature(student_id: int, etag: str, signature: str) -> bool:
+    """Check a signature produced by sign_photo"""
+    return hmac.compare_digest(sign_photo(student_id, etag), signature)
+
+
+def student_photo_url(student) -> Optional[str]:
+    """Signed, versioned URL of a student's thumbnail, or None if it has none"""
+    if not student.photo_etag:
+        return None
+    signature = sign_photo(student.id, student.photo_etag)
+    return f"/students/{student.id}/photo?v={student.photo_etag}&sig={signature}"
@@ -0,0 +1,103 @@
+"""Process-level cache of verified access tokens"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from . import metrics
+from .config import settings
+
+
+@dataclass(frozen=True)
+class TeacherPrincipal:
+    """The authenticated teacher as seen by request handlers"""
+    id: int
+    email: str
+    name: str
+
+
+class TokenCache:
+    """
+    TTL + LRU cache mapping a verified bearer token to its TeacherPrincipal
+
+    A hit skips both JWT signature verification and the teacher lookup.
+    Entries never outlive the token's own expiry. Teacher writes must call
+    invalidate_teacher() so changed or deleted accounts are re-read.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = max_entries or settings.TOKEN_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.TOKEN_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_teacher = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[TeacherPrincipal]:
+        """Return the cached principal for a token, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                principal, expires_at = entry
+                if time.time() < expires_at:
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    metrics.TOKEN_CACHE_LOOKUPS.inc(result="hit")
+                    return principal
+                self._discard(token)
+            self.misses += 1
+            metrics.TOKEN_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def put(self, token: str, principal: TeacherPrincipal, token_exp: Optional[float] = None):
+        """Cache a freshly verified token until the TTL or its exp, whichever is first"""
+        if not self.ttl_seconds:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_teacher.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def invalidate_teacher(self, teacher_id: int):
+        """Drop every cached token of a teacher"""
+        with self._lock:
+            for token in list(self._tokens_by_teacher.get(teacher_id, ())):
+                self._discard(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_teacher.clear()
+
+    def stats(self) -> dict:
+        """Entry count and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _discard(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            teacher_id = entry[0].id
+            tokens = self._tokens_by_teacher.get(teacher_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_teacher[teacher_id]
+
+
+token_cache = TokenCache()
@@ -0,0 +1,12 @@
+"""
+Recognition benchmark suite
+
+Run from the backend directory:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --quick --compare results.json
+
+Everything runs on synthetic frames and embeddings, so no network access or
+face dataset is needed. Synthetic frames rarely contain detectable faces;
+they measure the cost of each stage, not recognition accuracy.
+"""
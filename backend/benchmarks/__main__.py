@@ -0,0 +1,282 @@
+"""Command-line entry point: python -m benchmarks"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from .synthetic import frame_to_base64, frame_to_jpeg, probe_embeddings, synthetic_embeddings, synthetic_frame
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+CLASS_SIZES = [10, 100, 1000, 10000]
+FACES_PER_FRAME = 30
+CONCURRENCY = [1, 4, 16]
+CHIP_BATCHES = [1, 8, 32]
+
+
+def summarize(samples) -> dict:
+    """Summary of wall times in milliseconds"""
+    samples = sorted(samples)
+    return {
+        "repeat": len(samples),
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3)
+    }
+
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    """Call fn repeatedly and summarize wall time in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def measure_concurrent(fn, concurrency: int, repeat: int) -> dict:
+    """Call fn repeat times from each of `concurrency` threads at once; per-call latency plus p99 and throughput"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def client():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    fn()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = [ms for result in [executor.submit(client) for _ in range(concurrency)] for ms in result.result()]
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(samples)
+    stats["p99_ms"] = round(sorted(samples)[min(len(samples) - 1, int(0.99 * len(samples)))], 3)
+    stats["calls_per_s"] = round(len(samples) / elapsed, 2)
+    return stats
+
+
+def bench_detection(repeat: int, resolutions):
+    from app.face_recognition import FaceDetector
+
+    for width, height in resolutions:
+        frame = synthetic_frame(width, height)
+        yield "detect_faces", {"width": width, "height": height}, measure(
+            lambda: FaceDetector.detect_faces(frame), repeat
+        )
+        yield "detect_faces_adaptive", {"width": width, "height": height}, measure(
+            lambda: FaceDetector.detect_faces_adaptive(frame), repeat
+        )
+
+
+def bench_encoding(repeat: int, resolutions):
+    from app.face_recognition import FaceEncoder
+
+    for width, height in resolutions:
+        frame_base64 = frame_to_base64(synthetic_frame(width, height))
+        yield "generate_encodings_from_frame", {"width": width, "height": height}, measure(
+            lambda: FaceEncoder.generate_encodings_from_frame(frame_base64), repeat
+        )
+
+
+def bench_matching(repeat: int, class_sizes):
+    import numpy as np
+    from app.embedding_cache import ClassEmbeddingIndex
+    from app.face_recognition import FaceMatcher
+
+    for size in class_sizes:
+        known = synthetic_embeddings(size)
+        student_ids = np.arange(1, size + 1, dtype=np.int64)
+        detected = list(probe_embeddings(known, FACES_PER_FRAME))
+        known_encodings = list(zip(student_ids.tolist(), known))
+        index = ClassEmbeddingIndex(0, student_ids, known.astype(np.float32))
+        params = {"class_size": size, "faces": len(detected)}
+
+        yield "match_faces", params, measure(
+            lambda: FaceMatcher.match_faces(detected, known_encodings), repeat
+        )
+        yield "match_faces_batch", params, measure(
+            lambda: FaceMatcher.match_faces_batch(detected, known, student_ids), repeat
+        )
+        yield "class_index_match_float32", params, measure(
+            lambda: index.match(detected), repeat
+        )
+
+
+def bench_mark_attendance(repeat: int, class_sizes):
+    import numpy as np
+    from app import models, schemas
+    from app.api.attendance import mark_attendance
+    from app.database import SessionLocal, init_db
+    from app.embedding_cache import embedding_cache
+    from app.face_recognition import FaceEncoder
+    from app.token_cache import TeacherPrincipal
+
+    init_db()
+    request = schemas.AttendanceMarkRequest(frame_base64=frame_to_base64(synthetic_frame(640, 480)))
+
+    with SessionLocal() as db:
+        teacher = models.Teacher(email="bench@example.com", name="Bench", hashed_password="-")
+        db.add(teacher)
+        db.commit()
+        principal = TeacherPrincipal(id=teacher.id, email=teacher.email, name=teacher.name)
+
+        for size in class_sizes:
+            class_obj = models.Class(name=f"bench-{size}", teacher_id=teacher.id)
+            db.add(class_obj)
+            db.commit()
+            for student_id, encoding in enumerate(synthetic_embeddings(size, seed=size)):
+                embedding = FaceEncoder.encoding_to_bytes(encoding)
+                db.add(models.Student(
+                    name=f"student-{student_id}",
+                    roll_number=str(student_id),
+                    class_id=class_obj.id,
+                    face_embedding=embedding,
+                    face_samples=embedding
+                ))
+            db.commit()
+
+            params = {"class_size": size, "width": 640, "height": 480}
+            yield "mark_attendance", params, measure(
+                lambda: mark_attendance(class_obj.id, request, principal, db), repeat
+            )
+
+            def cold():
+                embedding_cache.invalidate(class_obj.id)
+                mark_attendance(class_obj.id, request, principal, db)
+
+            yield "mark_attendance_cold_cache", params, measure(cold, repeat)
+
+
+def bench_batching(repeat: int, concurrency_levels):
+    """Batched against unbatched encoding: the encoder call alone, then whole requests on a worker pool"""
+    import numpy as np
+    from app.face_recognition import FaceEncoder
+    from app.face_recognition.batching import EncodingBatcher
+    from app.face_recognition.tasks import detect_frame
+    from app.face_recognition.worker_pool import RecognitionPool
+
+    rng = np.random.default_rng(0)
+    for size in CHIP_BATCHES:
+        chips = [rng.integers(0, 256, size=(150, 150, 3), dtype=np.uint8) for _ in range(size)]
+        params = {"chips": size}
+        yield "encode_chips_one_call", params, measure(lambda: FaceEncoder.encode_chips(chips), repeat)
+        yield "encode_chips_per_chip", params, measure(
+            lambda: [FaceEncoder.encode_chips([chip]) for chip in chips], repeat
+        )
+
+    frame = frame_to_jpeg(synthetic_frame(1280, 720))
+    faces = len(detect_frame(frame)[0])
+    workers = int(os.environ["RECOGNITION_WORKERS"]) or os.cpu_count() or 1
+    pool = RecognitionPool(workers=workers, queue_size=max(concurrency_levels))
+    try:
+        for concurrency in concurrency_levels:
+            for max_batch in (1, 32):
+                batcher = EncodingBatcher(pool, max_batch=max_batch)
+                params = {"concurrency": concurrency, "max_batch": max_batch, "workers": workers, "faces": faces}
+                yield "recognize_concurrent", params, measure_concurrent(
+                    lambda: batcher.recognize(frame), concurrency, repeat
+                )
+    finally:
+        pool.shutdown()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path: str):
+    """Print the median ratio of every benchmark also present in the baseline"""
+    with open(baseline_path) as f:
+        baseline = {
+            (entry["name"], json.dumps(entry["params"], sort_keys=True)): entry["stats"]["median_ms"]
+            for entry in json.load(f)["results"]
+        }
+    for entry in results:
+        key = (entry["name"], json.dumps(entry["params"], sort_keys=True))
+        if key in baseline and baseline[key]:
+            ratio = entry["stats"]["median_ms"] / baseline[key]
+            print(f"{entry['name']:<32} {key[1]:<48} {ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognition benchmark suite")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per benchmark")
+    parser.add_argument("--quick", action="store_true", help="fewer runs, smaller inputs")
+    parser.add_argument("--only", nargs="+", choices=["detection", "encoding", "matching", "mark_attendance", "batching"],
+                        help="run only these sections")
+    parser.add_argument("--compare", metavar="BASELINE", help="print median ratios against an earlier run")
+    args = parser.parse_args(argv)
+
+    # Isolate the app from any real database and on-disk indexes; must
+    # happen before app.config is imported
+    workdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["EMBEDDING_STORE_DIR"] = os.path.join(workdir, "embeddings")
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(workdir, "face_index.npz")
+    # Repeated timings of one frame would otherwise all be cache hits
+    os.environ["FRAME_CACHE_SIZE"] = "0"
+    os.environ.setdefault("RECOGNITION_WORKERS", "0")
+
+    repeat = 3 if args.quick else args.repeat
+    resolutions = RESOLUTIONS[:2] if args.quick else RESOLUTIONS
+    class_sizes = CLASS_SIZES[:3] if args.quick else CLASS_SIZES
+    concurrency = CONCURRENCY[:2] if args.quick else CONCURRENCY
+    sections = {
+        "detection": lambda: bench_detection(repeat, resolutions),
+        "encoding": lambda: bench_encoding(repeat, resolutions),
+        "matching": lambda: bench_matching(repeat, class_sizes),
+        "mark_attendance": lambda: bench_mark_attendance(repeat, class_sizes),
+        "batching": lambda: bench_batching(repeat, concurrency),
+    }
+
+    results = []
+    for section, run in sections.items():
+        if args.only and section not in args.only:
+            continue
+        for name, params, stats in run():
+            print(f"{name:<32} {json.dumps(params):<48} median {stats['median_ms']:>10.3f} ms")
+            results.append({"section": section, "name": name, "params": params, "stats": stats})
+
+    import numpy as np
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "recognition_workers": int(os.environ["RECOGNITION_WORKERS"])
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
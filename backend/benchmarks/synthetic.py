@@ -0,0 +1,49 @@
+"""Deterministic synthetic inputs for the benchmarks"""
+import base64
+
+import cv2
+import numpy as np
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """RGB frame with smooth shading, noise and a few face-sized ellipses"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    shading = 80 + 60 * np.sin(x / 97.0) * np.cos(y / 61.0)
+    frame = np.repeat(shading[:, :, None], 3, axis=2)
+    frame += rng.normal(0, 12, size=frame.shape)
+
+    # Skin-toned ellipses with darker eyes give HOG realistic gradients
+    for _ in range(max(1, width // 320)):
+        cx, cy = int(rng.uniform(0.2, 0.8) * width), int(rng.uniform(0.3, 0.7) * height)
+        size = int(rng.uniform(0.08, 0.15) * width)
+        cv2.ellipse(frame, (cx, cy), (size, int(size * 1.3)), 0, 0, 360, (190, 150, 120), -1)
+        for dx in (-size // 3, size // 3):
+            cv2.circle(frame, (cx + dx, cy - size // 4), max(2, size // 8), (40, 30, 30), -1)
+        cv2.ellipse(frame, (cx, cy + size // 2), (size // 3, max(2, size // 10)), 0, 0, 180, (90, 40, 40), -1)
+
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def frame_to_jpeg(frame: np.ndarray, quality: int = 85) -> bytes:
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+def frame_to_base64(frame: np.ndarray) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(frame_to_jpeg(frame)).decode()
+
+
+def synthetic_embeddings(n: int, dim: int = 128, seed: int = 0) -> np.ndarray:
+    """Encodings with roughly the scale of dlib's (component std ~0.09)"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.09, size=(n, dim))
+
+
+def probe_embeddings(known: np.ndarray, n: int, noise: float = 0.02, seed: int = 1) -> np.ndarray:
+    """Noisy copies of n known encodings, as if the same students were seen again"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(known), size=min(n, len(known)), replace=False)
+    return known[rows] + rng.normal(0, noise, size=(len(rows), known.shape[1]))
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Keep the app away from any real database and on-disk indexes; must run
+# before app.config is imported
+_workdir = tempfile.mkdtemp(prefix="attendance-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ.setdefault("EMBEDDING_STORE_DIR", os.path.join(_workdir, "embeddings"))
+os.environ.setdefault("VECTOR_INDEX_PATH", os.path.join(_workdir, "face_index.npz"))
+os.environ.setdefault("RECOGNITION_WORKERS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
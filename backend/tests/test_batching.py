@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from app.face_recognition import tasks
+from app.face_recognition.batching import EncodingBatcher
+from app.face_recognition.worker_pool import RecognitionPoolBusy
+
+
+class FakePool:
+    """
+    Stands in for the recognition pool: a "frame" is bytes((n_faces, frame_id)),
+    detection returns one chip per face named after the frame, and encoding
+    tags every chip so each result can be traced back to its frame
+    """
+
+    def __init__(self, detect_seconds=0.005, fail_batches_over=None):
+        self.detect_seconds = detect_seconds
+        self.fail_batches_over = fail_batches_over
+        self.encode_calls = []
+        self._lock = threading.Lock()
+
+    def run(self, fn, *args):
+        if fn is tasks.detect_frame:
+            image_data, region, skip_locations = args
+            time.sleep(self.detect_seconds)
+            n_faces, frame_id = image_data
+            locations = [(i, i + 1, i + 1, i) for i in range(n_faces)]
+            skipped = {tuple(location) for location in skip_locations or []}
+            chips = [
+                None if location in skipped else f"{frame_id}:{i}"
+                for i, location in enumerate(locations)
+            ]
+            return locations, chips, {"detect_ms": 1.0}
+        if fn is tasks.encode_chips:
+            (chips,) = args
+            with self._lock:
+                self.encode_calls.append(list(chips))
+            if self.fail_batches_over is not None and len(chips) > self.fail_batches_over:
+                raise RecognitionPoolBusy("full")
+            return [f"enc({chip})" for chip in chips], 2.0
+        if fn is tasks.encode_frame:
+            return [(0, 1, 1, 0)], ["unbatched"], {}
+        raise AssertionError(fn)
+
+
+def run_concurrently(batcher, frames):
+    results, errors = {}, []
+
+    def request(frame):
+        try:
+            results[frame] = batcher.recognize(frame)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(frame,)) for frame in frames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def expected_encodings(frame):
+    n_faces, frame_id = frame
+    return [f"enc({frame_id}:{i})" for i in range(n_faces)]
+
+
+def test_concurrent_requests_share_batches_and_get_their_own_slice():
+    pool = FakePool()
+    batcher = EncodingBatcher(pool, max_batch=64, max_wait_ms=50)
+    frames = [bytes((frame_id % 3 + 1, frame_id)) for frame_id in range(12)]
+
+    results, errors = run_concurrently(batcher, frames)
+
+    assert errors == []
+    for frame in frames:
+        locations, encodings, timings = results[frame]
+        assert encodings == expected_encodings(frame)
+        assert len(locations) == len(encodings)
+        assert timings["encode_ms"] == 2.0
+        assert timings["batch_wait_ms"] >= 0
+    assert len(pool.encode_calls) < len(frames)
+    stats = batcher.stats()
+    assert stats["faces"] == sum(frame[0] for frame in frames)
+    assert stats["avg_batch_size"] > 1
+
+
+def test_batches_never_exceed_max_batch_when_requests_fit():
+    pool = FakePool()
+    batcher = EncodingBatcher(pool, max_batch=4, max_wait_ms=50)
+    frames = [bytes((2, frame_id)) for frame_id in range(10)]
+
+    results, errors = run_concurrently(batcher, frames)
+
+    assert errors == []
+    assert all(len(chips) <= 4 for chips in pool.encode_calls)
+    for frame in frames:
+        assert results[frame][1] == expected_encodings(frame)
+
+
+def test_skipped_faces_keep_none_encodings():
+    batcher = EncodingBatcher(FakePool(), max_batch=8, max_wait_ms=1)
+    locations, encodings, _ = batcher.recognize(bytes((3, 5)), None, [(1, 2, 2, 1)])
+    assert len(locations) == 3
+    assert encodings == ["enc(5:0)", None, "enc(5:2)"]
+
+
+def test_frame_without_faces_to_encode_skips_the_encoder():
+    pool = FakePool()
+    batcher = EncodingBatcher(pool, max_batch=8, max_wait_ms=1)
+    assert batcher.recognize(bytes((0, 1))) == ([], [], {"detect_ms": 1.0, "encode_ms": 0.0})
+    assert pool.encode_calls == []
+    assert batcher._detecting == 0
+
+
+def test_lone_request_does_not_wait_for_the_window():
+    batcher = EncodingBatcher(FakePool(detect_seconds=0), max_batch=8, max_wait_ms=500)
+    started = time.monotonic()
+    batcher.recognize(bytes((1, 1)))
+    assert time.monotonic() - started < 0.25
+
+
+def test_disabled_batcher_runs_encode_frame():
+    pool = FakePool()
+    batcher = EncodingBatcher(pool, max_batch=1)
+    assert not batcher.enabled
+    assert batcher.recognize(bytes((2, 1)))[1] == ["unbatched"]
+    assert pool.encode_calls == []
+
+
+def test_failed_batch_falls_back_to_per_request_encoding():
+    pool = FakePool(fail_batches_over=2)
+    batcher = EncodingBatcher(pool, max_batch=64, max_wait_ms=50)
+    frames = [bytes((2, frame_id)) for frame_id in range(6)]
+
+    results, errors = run_concurrently(batcher, frames)
+
+    assert errors == []
+    for frame in frames:
+        assert results[frame][1] == expected_encodings(frame)
+    assert batcher.stats()["fallbacks"] > 0
+
+
+def test_failed_batch_of_one_request_raises_once():
+    pool = FakePool(fail_batches_over=0)
+    batcher = EncodingBatcher(pool, max_batch=8, max_wait_ms=1)
+    with pytest.raises(RecognitionPoolBusy):
+        batcher.recognize(bytes((1, 1)))
+    assert len(pool.encode_calls) == 1
+    assert batcher.stats()["fallbacks"] == 0
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from app import embedding_cache as embedding_cache_module
+from app.embedding_cache import ClassEmbeddingIndex, EmbeddingCache
+from app.embedding_store import EmbeddingStore
+
+CLASS_ID = 7
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh embedding store shared by every cache in the test, like one per worker"""
+    store = EmbeddingStore(directory=str(tmp_path))
+    monkeypatch.setattr(embedding_cache_module, "embedding_store", store)
+    return store
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Stands in for the students table: class_id -> list of student ids"""
+    students = {CLASS_ID: [1, 2]}
+    loads = []
+
+    def load_from_db(cls, db, class_id):
+        loads.append(class_id)
+        student_ids = np.array(students[class_id], dtype=np.int64)
+        matrix = np.random.default_rng(len(student_ids)).normal(0, 0.09, size=(len(student_ids), 128))
+        return cls(class_id, student_ids, matrix.astype(np.float32))
+
+    monkeypatch.setattr(ClassEmbeddingIndex, "load_from_db", classmethod(load_from_db))
+    return students, loads
+
+
+def test_hit_is_served_without_reloading(store, database):
+    _, loads = database
+    cache = EmbeddingCache(ttl_seconds=0)
+
+    first = cache.get(CLASS_ID, db=None)
+    assert cache.get(CLASS_ID, db=None) is first
+    assert loads == [CLASS_ID]
+
+
+def test_invalidate_in_another_worker_reloads_the_class(store, database):
+    students, _ = database
+    worker_a, worker_b = EmbeddingCache(ttl_seconds=0), EmbeddingCache(ttl_seconds=0)
+    assert worker_a.get(CLASS_ID, db=None).student_ids.tolist() == [1, 2]
+
+    students[CLASS_ID].append(3)
+    worker_b.invalidate(CLASS_ID)
+
+    assert worker_a.get(CLASS_ID, db=None).student_ids.tolist() == [1, 2, 3]
+
+
+def test_unreadable_store_keeps_serving_the_cached_index(store, database, monkeypatch):
+    _, loads = database
+    cache = EmbeddingCache(ttl_seconds=0)
+    first = cache.get(CLASS_ID, db=None)
+
+    def unreadable(class_id):
+        raise OSError("store unavailable")
+
+    monkeypatch.setattr(store, "class_version", unreadable)
+    assert cache.get(CLASS_ID, db=None) is first
+    assert loads == [CLASS_ID]
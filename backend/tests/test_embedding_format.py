@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import Base
+from app.face_recognition import embedding_format
+from app.migrations import convert_embedding_format
+
+
+def _encodings(n=3, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.09, size=(n, 128))
+
+
+@pytest.mark.parametrize("dtype, result_dtype, tolerance", [
+    ("float64", np.float64, 0.0),
+    ("float32", np.float32, 1e-6),
+    ("int8", np.float32, 0.01),
+])
+def test_round_trip(dtype, result_dtype, tolerance):
+    encodings = _encodings()
+    data = embedding_format.pack(encodings, dtype)
+
+    assert embedding_format.describe(data) == (embedding_format.DTYPE_CODES[dtype], 128)
+    unpacked = embedding_format.unpack(data)
+    assert unpacked.dtype == result_dtype
+    assert unpacked.shape == (3, 128)
+    assert embedding_format.max_error(encodings, data) <= tolerance
+
+
+def test_single_encoding_packs_as_one_row():
+    encoding = _encodings(1)[0]
+    assert embedding_format.unpack(embedding_format.pack(encoding)).shape == (1, 128)
+
+
+def test_int8_zero_row():
+    data = embedding_format.pack(np.zeros((1, 128)), "int8")
+    assert not embedding_format.unpack(data).any()
+
+
+def test_legacy_blob_is_detected_and_read():
+    encodings = _encodings(2)
+    legacy = encodings.astype(np.float64).tobytes()
+
+    assert embedding_format.describe(legacy) == (None, 128)
+    np.testing.assert_array_equal(embedding_format.unpack(legacy), encodings)
+
+
+def test_legacy_blob_starting_like_a_header_is_still_legacy():
+    # A header is only trusted if the payload length fits its row size
+    encodings = _encodings(1)
+    legacy = bytearray(encodings.tobytes())
+    legacy[:4] = embedding_format.HEADER.pack(embedding_format.FORMAT_MARKER, embedding_format.INT8, 128)
+    assert embedding_format.describe(bytes(legacy))[0] is None
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(KeyError):
+        embedding_format.pack(_encodings(), "float16")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def _add_legacy_student(engine, encodings):
+    legacy = np.asarray(encodings, dtype=np.float64)
+    with Session(engine) as db:
+        teacher = models.Teacher(email="t@example.com", name="T", hashed_password="-")
+        db.add(teacher)
+        db.flush()
+        class_obj = models.Class(name="c", teacher_id=teacher.id)
+        db.add(class_obj)
+        db.flush()
+        student = models.Student(
+            name="s", class_id=class_obj.id,
+            face_embedding=legacy[0].tobytes(), face_samples=legacy.tobytes()
+        )
+        db.add(student)
+        db.flush()
+        db.add(models.FaceEmbedding(student_id=student.id, class_id=class_obj.id, embedding=legacy[0].tobytes()))
+        db.commit()
+        return student.id
+
+
+def _stored(engine, student_id):
+    with Session(engine) as db:
+        student = db.get(models.Student, student_id)
+        sample = db.query(models.FaceEmbedding.embedding).filter_by(student_id=student_id).scalar()
+        return student.face_embedding, student.face_samples, sample
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32", "int8"])
+def test_migration_converts_legacy_blobs(engine, monkeypatch, dtype):
+    monkeypatch.setattr(settings, "EMBEDDING_DTYPE", dtype)
+    encodings = _encodings()
+    student_id = _add_legacy_student(engine, encodings)
+
+    assert convert_embedding_format(engine) == 3
+
+    embedding, samples, sample = _stored(engine, student_id)
+    code = embedding_format.DTYPE_CODES[dtype]
+    for blob in (embedding, samples, sample):
+        assert embedding_format.describe(blob)[0] == code
+    assert embedding_format.max_error(encodings, samples) <= settings.EMBEDDING_MAX_ERROR
+    assert embedding_format.max_error(encodings[:1], embedding) <= settings.EMBEDDING_MAX_ERROR
+
+    # Already converted blobs are left alone
+    assert convert_embedding_format(engine) == 0
+
+
+def test_migration_keeps_float64_above_max_error(engine, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_DTYPE", "int8")
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_ERROR", 1e-9)
+    encodings = _encodings()
+    student_id = _add_legacy_student(engine, encodings)
+
+    assert convert_embedding_format(engine) == 3
+
+    for blob in _stored(engine, student_id):
+        assert embedding_format.describe(blob)[0] == embedding_format.FLOAT64
+    _, samples, _ = _stored(engine, student_id)
+    np.testing.assert_array_equal(embedding_format.unpack(samples), encodings)
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.face_recognition.motion_gate import FULL, REGION, STATIC, MotionGate
+
+WIDTH, HEIGHT = 640, 480
+
+
+def background():
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    gray = (80 + 40 * np.sin(x / 50.0) * np.cos(y / 40.0)).astype(np.uint8)
+    return np.repeat(gray[:, :, None], 3, axis=2)
+
+
+def encode(frame) -> bytes:
+    ok, buffer = cv2.imencode(".png", frame)
+    assert ok
+    return buffer.tobytes()
+
+
+def with_patch(frame, top, left, size, value=255):
+    frame = frame.copy()
+    frame[top:top + size, left:left + size] = value
+    return frame
+
+
+@pytest.fixture
+def gate():
+    return MotionGate(
+        size=(64, 48), pixel_threshold=12, min_changed_fraction=0.005,
+        max_region_fraction=0.5, region_margin=0.05, max_skipped_frames=3
+    )
+
+
+def test_first_frame_is_full(gate):
+    assert gate.check(encode(background())).mode == FULL
+
+
+def test_identical_frame_is_static(gate):
+    frame = encode(background())
+    gate.check(frame)
+    decision = gate.check(frame)
+    assert decision.mode == STATIC
+    assert decision.region is None
+
+
+def test_isolated_noise_is_static(gate):
+    gate.check(encode(background()))
+    # One changed thumbnail pixel has no changed neighbours
+    assert gate.check(encode(with_patch(background(), 200, 300, 10))).mode == STATIC
+
+
+def test_local_change_gives_padded_region(gate):
+    gate.check(encode(background()))
+    decision = gate.check(encode(with_patch(background(), 100, 400, 80)))
+
+    assert decision.mode == REGION
+    top, right, bottom, left = decision.region
+    assert top <= 100 and left <= 400 and bottom >= 180 and right >= 480
+    assert 0 <= top and 0 <= left and bottom <= HEIGHT and right <= WIDTH
+    # Padded by the margin but nowhere near the whole frame
+    assert (bottom - top) * (right - left) < 0.25 * WIDTH * HEIGHT
+
+
+def test_large_change_is_full(gate):
+    gate.check(encode(background()))
+    changed = background()
+    changed[:, :WIDTH * 3 // 4] = 255
+    assert gate.check(encode(changed)).mode == FULL
+
+
+def test_reference_only_moves_on_recognized_frames(gate):
+    base = background()
+    gate.check(encode(base))
+    # A change seen once is compared against the original reference again
+    moved = with_patch(base, 100, 400, 80)
+    assert gate.check(encode(moved)).mode == REGION
+    assert gate.check(encode(moved)).mode == STATIC
+    assert gate.check(encode(base)).mode == REGION
+
+
+def test_full_pass_forced_after_max_skipped_frames(gate):
+    frame = encode(background())
+    modes = [gate.check(frame).mode for _ in range(6)]
+    assert modes == [FULL, STATIC, STATIC, STATIC, FULL, STATIC]
+
+
+def test_resolution_change_is_full(gate):
+    gate.check(encode(background()))
+    smaller = cv2.resize(background(), (320, 240))
+    assert gate.check(encode(smaller)).mode == FULL
+
+
+def test_undecodable_frame_raises(gate):
+    with pytest.raises(ValueError):
+        gate.check(b"not an image")
@@ -0,0 +1,116 @@
+import numpy as np
+
+from app.face_recognition.tracker import FaceTracker, greedy_assignment, iou_matrix
+
+# Boxes are (top, right, bottom, left)
+A = (0, 10, 10, 0)
+A_SHIFTED = (0, 11, 10, 1)
+B = (100, 110, 110, 100)
+
+
+def test_iou_matrix():
+    iou = iou_matrix([A, B], [A, (0, 20, 10, 10), (0, 10, 5, 0)])
+    np.testing.assert_allclose(iou, [[1.0, 0.0, 0.5], [0.0, 0.0, 0.0]])
+
+
+def test_iou_matrix_empty():
+    assert iou_matrix([], [A]).shape == (0, 1)
+    assert iou_matrix([A], []).shape == (1, 0)
+
+
+def test_iou_matrix_degenerate_box():
+    assert iou_matrix([(5, 5, 5, 5)], [(5, 5, 5, 5)])[0, 0] == 0.0
+
+
+def test_greedy_assignment_prefers_highest_iou():
+    iou = np.array([
+        [0.9, 0.8],
+        [0.85, 0.1],
+    ])
+    # Row 0 takes column 0 first, so row 1 cannot reach the threshold
+    assert greedy_assignment(iou, 0.3) == [(0, 0)]
+    assert sorted(greedy_assignment(iou, 0.05)) == [(0, 0), (1, 1)]
+
+
+def test_greedy_assignment_threshold_and_empty():
+    assert greedy_assignment(np.array([[0.2]]), 0.3) == []
+    assert greedy_assignment(np.zeros((0, 3)), 0.3) == []
+
+
+def make_tracker(**options):
+    defaults = {"iou_threshold": 0.3, "max_misses": 2, "reverify_frames": 3, "confident_distance": 0.45}
+    defaults.update(options)
+    return FaceTracker(**defaults)
+
+
+def test_update_continues_and_starts_tracks():
+    tracker = make_tracker()
+    first = tracker.update([A])
+    second = tracker.update([A_SHIFTED, B])
+
+    assert second[0] is first[0]
+    assert second[0].location == A_SHIFTED
+    assert second[1] is not first[0]
+    assert len(tracker.tracks) == 2
+
+
+def test_unmatched_tracks_age_out_after_max_misses():
+    tracker = make_tracker(max_misses=2)
+    tracker.update([A])
+    tracker.update([])
+    tracker.update([])
+    assert len(tracker.tracks) == 1 and tracker.tracks[0].misses == 2
+    tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_region_update_leaves_tracks_outside_it():
+    tracker = make_tracker()
+    tracker.update([A, B])
+    # Only the area around B was searched; A was not looked for
+    tracker.update([B], region=(90, 120, 120, 90))
+    misses = {track.location: track.misses for track in tracker.tracks}
+    assert misses == {A: 0, B: 0}
+
+    tracker.update([], region=(90, 120, 120, 90))
+    misses = {track.location: track.misses for track in tracker.tracks}
+    assert misses == {A: 0, B: 1}
+
+
+def test_confidence_needs_a_close_match():
+    tracker = make_tracker()
+    track = tracker.update([A])[0]
+    assert not tracker.is_confident(track)
+
+    tracker.verify(track, 7, 0.6)
+    assert not tracker.is_confident(track)
+
+    tracker.verify(track, 7, 0.3)
+    assert tracker.is_confident(track)
+    assert tracker.skip_locations() == [A]
+
+    tracker.verify(track, None, None)
+    assert not tracker.is_confident(track)
+
+
+def test_confident_track_is_reverified_every_n_frames():
+    tracker = make_tracker(reverify_frames=3)
+    track = tracker.update([A])[0]
+    tracker.verify(track, 7, 0.3)
+
+    confident = []
+    for _ in range(4):
+        tracker.update([A])
+        confident.append(tracker.is_confident(track))
+    assert confident == [True, True, False, False]
+
+    tracker.verify(track, 7, 0.3)
+    assert tracker.is_confident(track)
+
+
+def test_tracking_disabled_never_skips():
+    tracker = make_tracker(reverify_frames=0)
+    track = tracker.update([A])[0]
+    tracker.verify(track, 7, 0.1)
+    assert not tracker.is_confident(track)
+    assert tracker.skip_locations() == []
@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import AddStudentModal from './AddStudentModal';
 import { studentAPI } from '../../services/api';
+import { API_BASE_URL } from '../../utils/constants';
 
 const StudentList = ({ students, classId, onRefresh }) => {
   const [showAddModal, setShowAddModal] = useState(false);
@@ -32,8 +33,8 @@ const StudentList = ({ students, classId, onRefresh }) => {
         {students.map((student) => (
           <div key={student.id} className="bg-white rounded-lg shadow p-4">
             <div className="flex items-start space-x-4">
-              {student.photo && (
-                <img src={`data:image/jpeg;base64,${student.photo}`} alt={student.name} className="w-16 h-16 rounded-full object-cover" />
+              {student.photo_url && (
+                <img src={`${API_BASE_URL}${student.photo_url}`} alt={student.name} className="w-16 h-16 rounded-full object-cover" />
               )}
               <div className="flex-1">
                 <h3 className="font-semibold">{student.name}</h3>